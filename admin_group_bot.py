@@ -1,61 +1,202 @@
 import logging
 import asyncio
+import html
+import random
+import re
+import signal
+import time
 from datetime import datetime
-from telegram import Update, BotCommand
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import Update, BotCommand, ChatPermissions
+from telegram.ext import (Application, CallbackQueryHandler, ChatMemberHandler, CommandHandler, MessageHandler,
+                          filters, ContextTypes)
 from telegram.constants import ParseMode, ChatMemberStatus
 from telegram.error import TelegramError
 import os
 
+from album_buffer import Album, AlbumBuffer
+from burst_buffer import Burst, BurstBuffer
 from config import Config
+from content_filter import LINK_MODES, normalize
+from delete_batcher import DeleteBatcher
+from health import HealthMonitor
+from http_client import build_request
+from logging_setup import setup_logging
+from metrics import CACHE_LOOKUPS, CONTENT_FILTERED, MUTES, REPOST_LATENCY, metrics_handler, register_collector, timed
+from web_server import WebServer
+from outbound_scheduler import OutboundScheduler, LANE_DELETE, LANE_NOTICE
+from repost_engine import RepostEngine, ALBUM_MEDIA, NAME_BUTTON_DATA, content_type
+from spam_detector import SpamDetector
+from chat_state import ChatRegistry, ChatState
+from state_backend import create_state_backend
+from state_store import LRUCache
+from update_processor import PerChatUpdateProcessor
+from worker_pool import ShardedWorkerPool
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Configure logging (written by a background thread, never on the event loop)
+setup_logging(
+    level=Config.LOG_LEVEL,
+    log_file=Config.LOG_FILE,
+    json_format=Config.LOG_FORMAT == 'json',
+    max_bytes=Config.LOG_MAX_BYTES,
+    backup_count=Config.LOG_BACKUP_COUNT,
+    sample_rate=Config.LOG_SAMPLE_RATE
 )
 logger = logging.getLogger(__name__)
 
 class AdminGroupBot:
     def __init__(self):
         # Create application with optimized settings
-        self.application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+        # Updates of different chats are handled concurrently, each chat's in order
+        self.update_processor = PerChatUpdateProcessor(Config.MAX_CONCURRENT_UPDATES)
+        # Long polling holds a connection for its whole timeout, so it gets its own pool
+        self.send_request = self._build_request(Config.HTTP_POOL_SIZE)
+        self.get_updates_request = self._build_request(Config.GET_UPDATES_POOL_SIZE)
+        self.application = (
+            Application.builder()
+            .token(Config.TELEGRAM_BOT_TOKEN)
+            .base_url(Config.TELEGRAM_BASE_URL)
+            .request(self.send_request)
+            .get_updates_request(self.get_updates_request)
+            .concurrent_updates(self.update_processor)
+            .build()
+        )
         
         # Add handlers
         self._add_handlers()
         
-        # Store admin users for each group
-        self.group_admins = {}
+        # Per-group state: admins, settings, spam windows and mutes
+        self.chats = ChatRegistry()
         
-        # Queue system to prevent conflicts
-        self.processing_queues = {}  # chat_id -> asyncio.Queue
-        self.processing_locks = {}  # chat_id -> asyncio.Lock
+        # Group messages are processed in per-chat order by a fixed pool of workers
+        self.workers = ShardedWorkerPool(
+            self._process_queued_message,
+            workers=Config.WORKER_COUNT,
+            queue_size=Config.WORKER_QUEUE_SIZE
+        )
         
         # Performance optimization: user name cache
-        self.user_name_cache = {}  # user_id -> name
+        self.user_name_cache = LRUCache(Config.USER_NAME_CACHE_SIZE, ttl=Config.USER_NAME_CACHE_TTL)  # user_id -> name
         
         # Anti-spam system
-        self.user_message_times = {}  # (chat_id, user_id) -> list of message times
-        self.muted_users = {}  # (chat_id, user_id) -> mute_until_time
-        self.spam_mode_enabled = {}  # chat_id -> bool (whether spam detection is enabled for admins)
+        self.spam_detector = SpamDetector(
+            Config.SPAM_THRESHOLD_MESSAGES,
+            Config.SPAM_WINDOW_SECONDS,
+            max_tracked_users=Config.SPAM_TRACKED_USERS_PER_CHAT
+        )
+        
+        # Where admin sets, mutes, spam windows and settings are stored (memory or Redis)
+        self.state = create_state_backend(
+            Config.STATE_BACKEND,
+            self.spam_detector,
+            redis_url=Config.REDIS_URL,
+            prefix=Config.REDIS_KEY_PREFIX,
+            database_url=Config.DATABASE_URL,
+            flush_interval=Config.DATABASE_FLUSH_INTERVAL
+        )
+        
+        # Rate-limit-aware dispatcher for all outbound moderation traffic
+        self.scheduler = OutboundScheduler(
+            global_rate=Config.GLOBAL_RATE_PER_SECOND,
+            global_burst=Config.GLOBAL_BURST,
+            chat_rate=Config.CHAT_RATE_PER_MINUTE / 60,
+            chat_burst=Config.CHAT_BURST,
+            max_retries=Config.MAX_FLOOD_RETRIES
+        )
+        self.repost_engine = RepostEngine(self.scheduler)
+        
+        # In groups with a merge window, a user's consecutive texts are reposted as one message
+        self.bursts = BurstBuffer(lambda burst: self.workers.submit(burst.chat_id, burst))
+        
+        # Deletions are queued per chat and sent in bulk with deleteMessages
+        self.deleter = DeleteBatcher(self.scheduler, self.application.bot, window=Config.DELETE_BATCH_WINDOW)
+        
+        # Album parts are collected and reposted as one media group on the chat's worker
+        self.albums = AlbumBuffer(
+            lambda album: self.workers.submit(album.chat_id, album),
+            wait=Config.ALBUM_WAIT_SECONDS
+        )
+        
+        # Periodic cleanup of expired mutes, stale spam windows and idle chats
+        self.sweeper_task = None
+        
+        # Background admin list refresh, with a bound on parallel API calls
+        self.admin_refresh_task = None
+        self.admin_refresh_slots = asyncio.Semaphore(Config.ADMIN_REFRESH_CONCURRENCY)
+        
+        # Set once persisted state is restored and background tasks run
+        self.ready = False
+        
+        # Liveness (event-loop lag, Bot API reachability) and readiness checks
+        self.health = HealthMonitor(
+            self.application.bot,
+            [self.send_request, self.get_updates_request],
+            self._readiness_problems,
+            max_loop_lag=Config.HEALTH_MAX_LOOP_LAG,
+            max_api_silence=Config.HEALTH_MAX_API_SILENCE,
+            probe_interval=Config.HEALTH_PROBE_INTERVAL
+        )
+        
+        # HTTP server: webhook ingestion (webhook mode only), health checks and Prometheus metrics
+        self.web_server = WebServer(
+            self.application,
+            Config.WEB_SERVER_HOST,
+            Config.WEB_SERVER_PORT,
+            webhook_path=Config.WEBHOOK_PATH if Config.BOT_MODE == "webhook" else None,
+            secret_token=Config.WEBHOOK_SECRET_TOKEN
+        )
+        self.web_server.add_route("GET", "/health", self.health.health_handler)
+        self.web_server.add_route("GET", "/ready", self.health.ready_handler)
+        if Config.METRICS_ENABLED:
+            register_collector(self)
+            self.web_server.add_route("GET", Config.METRICS_PATH, metrics_handler)
+    
+    @staticmethod
+    def _build_request(pool_size: int):
+        """Bot API request object with the configured timeouts and HTTP version"""
+        return build_request(
+            pool_size,
+            connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=Config.HTTP_READ_TIMEOUT,
+            write_timeout=Config.HTTP_WRITE_TIMEOUT,
+            pool_timeout=Config.HTTP_POOL_TIMEOUT,
+            http_version=Config.HTTP_VERSION,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            tcp_keepalive=Config.HTTP_TCP_KEEPALIVE
+        )
     
     def _add_handlers(self):
         """Add all command and message handlers"""
         # Command handlers
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("setup", self.setup_command))
-        self.application.add_handler(CommandHandler("status", self.status_command))
-        self.application.add_handler(CommandHandler("refresh_admins", self.refresh_admins_command))
+        # These may wait on getChatAdministrators; block=False keeps the chat's messages flowing meanwhile
+        self.application.add_handler(CommandHandler("setup", self.setup_command, block=False))
+        self.application.add_handler(CommandHandler("status", self.status_command, block=False))
+        self.application.add_handler(CommandHandler("refresh_admins", self.refresh_admins_command, block=False))
         self.application.add_handler(CommandHandler("unmute", self.unmute_command))
         self.application.add_handler(CommandHandler("spam_mode", self.spam_mode_command))
+        self.application.add_handler(CommandHandler("spam_limit", self.spam_limit_command))
+        self.application.add_handler(CommandHandler("merge_mode", self.merge_mode_command))
+        self.application.add_handler(CommandHandler("filter", self.filter_command))
         
         # Message handlers - handle all messages in groups (text, stickers, media, etc.)
         self.application.add_handler(MessageHandler(
-            filters.ChatType.GROUPS & ~filters.COMMAND, 
+            filters.ChatType.GROUPS & filters.UpdateType.MESSAGE & ~filters.COMMAND, 
             self.handle_group_message
         ))
         
+        # Edits of reposted messages are carried over to the repost
+        self.application.add_handler(MessageHandler(
+            filters.ChatType.GROUPS & filters.UpdateType.EDITED_MESSAGE,
+            self.handle_edited_message
+        ))
+        
+        # Author-name buttons attached to reposted stickers, polls, etc.
+        self.application.add_handler(CallbackQueryHandler(
+            self.handle_name_button,
+            pattern=f"^{NAME_BUTTON_DATA}$"
+        ))
+        
         # Handle new chat members
         self.application.add_handler(MessageHandler(
             filters.StatusUpdate.NEW_CHAT_MEMBERS,
@@ -68,6 +209,18 @@ class AdminGroupBot:
             self.handle_left_chat_member
         ))
         
+        # Keep admin lists current as members are promoted or demoted
+        self.application.add_handler(ChatMemberHandler(
+            self.handle_chat_member,
+            ChatMemberHandler.CHAT_MEMBER
+        ))
+        
+        # The bot's own membership: promoted, demoted or removed
+        self.application.add_handler(ChatMemberHandler(
+            self.handle_my_chat_member,
+            ChatMemberHandler.MY_CHAT_MEMBER
+        ))
+        
         # Error handler
         self.application.add_error_handler(self.error_handler)
     
@@ -107,6 +260,9 @@ class AdminGroupBot:
 /setup - تنظیم ربات در گروه
 /status - وضعیت ربات و لیست ادمین‌ها
 /refresh_admins - بروزرسانی لیست ادمین‌ها
+/spam_limit - نمایش یا تنظیم محدودیت ضد اسپم
+/merge_mode - ادغام پیام‌های پشت سر هم یک کاربر در یک پیام
+/filter - کلمات ممنوع و فیلتر لینک‌ها
 /help - نمایش این راهنما
 
 ⚙️ <b>نحوه کار:</b>
@@ -124,7 +280,7 @@ class AdminGroupBot:
 
 🛠️ <b>مشکلات احتمالی:</b>
 • اگر ربات پیام‌ها را حذف نمی‌کند، دسترسی ادمین را بررسی کنید
-• برای بروزرسانی لیست ادمین‌ها از /refresh_admins استفاده کنید
+• لیست ادمین‌ها خودکار بروز می‌شود؛ برای بروزرسانی فوری از /refresh_admins استفاده کنید
         """
         
         await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
@@ -143,51 +299,33 @@ class AdminGroupBot:
             )
             return
         
-        # Check if user is admin
-        try:
-            chat_member = await context.bot.get_chat_member(chat.id, user.id)
-            logger.info(f"User {user.id} status: {chat_member.status}")
-            
-            if chat_member.status not in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-                await update.message.reply_text(
-                    "❌ فقط ادمین‌های گروه می‌توانند این دستور را اجرا کنند."
-                )
-                return
-        except TelegramError as e:
-            logger.error(f"Error checking admin status: {e}")
+        # One getChatAdministrators call answers both "is the user admin" and "is the bot admin"
+        if not await self._refresh_group_admins(chat.id, context.bot):
             await update.message.reply_text(
                 "❌ خطا در بررسی دسترسی‌ها. لطفاً مطمئن شوید ربات دسترسی ادمین دارد."
             )
             return
         
+        # Check if user is admin
+        if not await self._authorize_admin(update, context):
+            return
+        
         # Check if bot is admin
-        try:
-            bot_member = await context.bot.get_chat_member(chat.id, context.bot.id)
-            logger.info(f"Bot status: {bot_member.status}")
-            
-            if bot_member.status not in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-                await update.message.reply_text(
-                    "❌ ربات باید دسترسی ادمین داشته باشد تا بتواند پیام‌ها را حذف کند.\n\n"
-                    "لطفاً دسترسی ادمین به ربات بدهید و دوباره تلاش کنید.\n\n"
-                    "📋 <b>دسترسی‌های مورد نیاز:</b>\n"
-                    "• Delete messages\n"
-                    "• Send messages\n"
-                    "• Read messages",
-                    parse_mode=ParseMode.HTML
-                )
-                return
-        except TelegramError as e:
-            logger.error(f"Error checking bot admin status: {e}")
+        if context.bot.id not in self._admins(chat.id):
             await update.message.reply_text(
-                "❌ خطا در بررسی دسترسی ربات. لطفاً مطمئن شوید ربات دسترسی ادمین دارد."
+                "❌ ربات باید دسترسی ادمین داشته باشد تا بتواند پیام‌ها را حذف کند.\n\n"
+                "لطفاً دسترسی ادمین به ربات بدهید و دوباره تلاش کنید.\n\n"
+                "📋 <b>دسترسی‌های مورد نیاز:</b>\n"
+                "• Delete messages\n"
+                "• Send messages\n"
+                "• Read messages\n"
+                "• Ban users",
+                parse_mode=ParseMode.HTML
             )
             return
         
-        # Refresh admin list
         try:
-            await self._refresh_group_admins(chat.id, context)
-            admin_count = len(self.group_admins.get(chat.id, []))
-            logger.info(f"Refreshed admins for chat {chat.id}: {admin_count} admins")
+            admin_count = len(self._admins(chat.id))
             
             await update.message.reply_text(
                 f"✅ <b>ربات با موفقیت تنظیم شد!</b>\n\n"
@@ -208,29 +346,16 @@ class AdminGroupBot:
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show bot status and admin list"""
         chat = update.effective_chat
-        user = update.effective_user
-        
-        # Check if it's a group
-        if chat.type not in ["group", "supergroup"]:
-            await update.message.reply_text(
-                "❌ این دستور فقط در گروه‌ها قابل استفاده است."
-            )
-            return
         
         # Check if user is admin
-        try:
-            chat_member = await context.bot.get_chat_member(chat.id, user.id)
-            if chat_member.status not in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-                await update.message.reply_text(
-                    "❌ فقط ادمین‌های گروه می‌توانند این دستور را اجرا کنند."
-                )
-                return
-        except TelegramError as e:
-            logger.error(f"Error checking admin status: {e}")
+        state = await self._authorize_admin(update, context)
+        if state is None:
             return
         
-        # Get admin list
-        admins = self.group_admins.get(chat.id, [])
+        # Names come from the cached admin list; fetch it once if some are missing
+        if not state.admins.issubset(state.admin_names):
+            await self._refresh_group_admins(chat.id, context.bot)
+        admins = state.admins
         
         if not admins:
             await update.message.reply_text(
@@ -244,13 +369,10 @@ class AdminGroupBot:
         # Format admin list
         admin_list = []
         for admin_id in admins:
-            try:
-                admin_member = await context.bot.get_chat_member(chat.id, admin_id)
-                admin_name = admin_member.user.first_name or "نامشخص"
-                if admin_member.user.username:
-                    admin_name += f" (@{admin_member.user.username})"
-                admin_list.append(f"• {admin_name}")
-            except TelegramError:
+            admin_name = state.admin_names.get(admin_id)
+            if admin_name is not None:
+                admin_list.append(f"• {html.escape(admin_name)}")
+            else:
                 admin_list.append(f"• کاربر {admin_id} (نامشخص)")
         
         status_text = f"""
@@ -272,31 +394,20 @@ class AdminGroupBot:
     async def refresh_admins_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Refresh admin list for the group"""
         chat = update.effective_chat
-        user = update.effective_user
-        
-        # Check if it's a group
-        if chat.type not in ["group", "supergroup"]:
-            await update.message.reply_text(
-                "❌ این دستور فقط در گروه‌ها قابل استفاده است."
-            )
-            return
         
         # Check if user is admin
-        try:
-            chat_member = await context.bot.get_chat_member(chat.id, user.id)
-            if chat_member.status not in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-                await update.message.reply_text(
-                    "❌ فقط ادمین‌های گروه می‌توانند این دستور را اجرا کنند."
-                )
-                return
-        except TelegramError as e:
-            logger.error(f"Error checking admin status: {e}")
+        if not await self._authorize_admin(update, context):
             return
         
         # Refresh admin list
-        old_count = len(self.group_admins.get(chat.id, []))
-        await self._refresh_group_admins(chat.id, context)
-        new_count = len(self.group_admins.get(chat.id, []))
+        old_count = len(self._admins(chat.id))
+        if not await self._refresh_group_admins(chat.id, context.bot):
+            await update.message.reply_text(
+                "❌ خطا در دریافت لیست ادمین‌ها. لیست قبلی حفظ شد.\n"
+                "لطفاً مطمئن شوید ربات دسترسی ادمین دارد."
+            )
+            return
+        new_count = len(self._admins(chat.id))
         
         await update.message.reply_text(
             f"🔄 <b>لیست ادمین‌ها بروزرسانی شد!</b>\n\n"
@@ -306,59 +417,126 @@ class AdminGroupBot:
             parse_mode=ParseMode.HTML
         )
     
-    async def _refresh_group_admins(self, chat_id: int, context: ContextTypes.DEFAULT_TYPE):
-        """Refresh admin list for a specific group"""
+    async def _refresh_group_admins(self, chat_id: int, bot) -> bool:
+        """Refresh admin list for a specific group; on failure the last known list is kept"""
+        state = self.chats.get_or_create(chat_id)
+        # Schedule the next refresh first so concurrent callers don't repeat this one
+        self._schedule_admin_refresh(state)
         try:
-            admins = await context.bot.get_chat_administrators(chat_id)
-            admin_ids = []
-            
-            for admin in admins:
-                if admin.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-                    admin_ids.append(admin.user.id)
-            
-            self.group_admins[chat_id] = admin_ids
-            logger.info(f"Refreshed admins for chat {chat_id}: {len(admin_ids)} admins")
-            
+            admins = await bot.get_chat_administrators(chat_id)
         except TelegramError as e:
-            logger.error(f"Error refreshing admins for chat {chat_id}: {e}")
-            self.group_admins[chat_id] = []
+            logger.error(f"Error refreshing admins for chat {chat_id}, keeping {len(state.admins)} known admins: {e}")
+            return False
+        
+        admin_names = {}
+        for admin in admins:
+            if admin.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
+                admin_names[admin.user.id] = self._admin_display_name(admin.user)
+        
+        state.admins = frozenset(admin_names)
+        state.admin_names = admin_names
+        await self.state.save_admins(state)
+        logger.info(f"Refreshed admins for chat {chat_id}: {len(admin_names)} admins")
+        return True
+    
+    @staticmethod
+    def _admin_display_name(user) -> str:
+        name = user.first_name or "نامشخص"
+        if user.username:
+            name += f" (@{user.username})"
+        return name
+    
+    async def _authorize_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Chat state if the command was sent by an admin of a group; otherwise reply and return None.
+        
+        Uses the cached admin list, so authorizing a command costs no API call.
+        """
+        chat = update.effective_chat
+        message = update.message
+        
+        if chat.type not in ["group", "supergroup"]:
+            await message.reply_text("❌ این دستور فقط در گروه‌ها قابل استفاده است.")
+            return None
+        
+        state = await self._group_state(chat.id, context.bot)
+        # Anonymous admins post on behalf of the group itself
+        if message.sender_chat is not None and message.sender_chat.id == chat.id:
+            return state
+        if update.effective_user.id in state.admins:
+            return state
+        
+        await message.reply_text("❌ فقط ادمین‌های گروه می‌توانند این دستور را اجرا کنند.")
+        return None
+    
+    def _schedule_admin_refresh(self, state: ChatState, delay: float = None):
+        """Set when a chat's admin list is next re-fetched (TTL with jitter by default)"""
+        if delay is None:
+            jitter = Config.ADMIN_REFRESH_JITTER
+            delay = Config.ADMIN_REFRESH_TTL * random.uniform(1 - jitter, 1 + jitter)
+        state.admins_due = time.monotonic() + delay
+    
+    async def _refresh_due_admins(self, bot):
+        """Re-fetch the admin lists whose TTL has passed, a few chats at a time"""
+        now = time.monotonic()
+        due = [state.chat_id for state in self.chats
+               if state.admins_due is not None and state.admins_due <= now]
+        
+        async def refresh(chat_id: int):
+            async with self.admin_refresh_slots:
+                await self._refresh_group_admins(chat_id, bot)
+        
+        if due:
+            results = await asyncio.gather(*(refresh(chat_id) for chat_id in due), return_exceptions=True)
+            for chat_id, result in zip(due, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Unexpected error refreshing admins for chat {chat_id}: {result}")
+            logger.debug(f"Admin refresh pass: {len(due)} chats")
+    
+    async def _refresh_admins_periodically(self, bot):
+        while True:
+            await asyncio.sleep(Config.ADMIN_REFRESH_CHECK_INTERVAL)
+            try:
+                await self._refresh_due_admins(bot)
+            except Exception as e:
+                logger.error(f"Error in admin refresh pass: {e}")
     
     async def unmute_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unmute a user (admin only)"""
         chat = update.effective_chat
         user = update.effective_user
         
-        # Check if in group
-        if chat.type not in ["group", "supergroup"]:
-            await update.message.reply_text("❌ این دستور فقط در گروه‌ها قابل استفاده است!")
-            return
-        
         # Check if user is admin
-        if user.id not in self.group_admins.get(chat.id, []):
-            await update.message.reply_text("❌ فقط ادمین‌ها می‌توانند از این دستور استفاده کنند!")
+        state = await self._authorize_admin(update, context)
+        if state is None:
             return
         
-        # Check if user replied to a message
-        if not update.message.reply_to_message:
-            await update.message.reply_text("❌ لطفاً روی پیام کاربری که می‌خواهید از سکوت دربیاورید ریپلای کنید!")
+        # Target is the replied-to user, or a user id given as argument
+        # (natively muted users can't post, so there may be nothing to reply to)
+        if context.args:
+            try:
+                target_id = int(context.args[0])
+            except ValueError:
+                await update.message.reply_text("❌ شناسه کاربر باید عدد باشد!")
+                return
+            target_name = str(target_id)
+        elif update.message.reply_to_message:
+            target_user = update.message.reply_to_message.from_user
+            target_id = target_user.id
+            target_name = target_user.first_name or 'کاربر'
+        else:
+            await update.message.reply_text("❌ لطفاً روی پیام کاربری که می‌خواهید از سکوت دربیاورید ریپلای کنید یا شناسه او را بنویسید!")
             return
         
-        target_user = update.message.reply_to_message.from_user
-        mute_key = (chat.id, target_user.id)
-        
-        # Check if user is muted
-        if mute_key in self.muted_users:
-            del self.muted_users[mute_key]
-            # Also clear message history
-            message_key = (chat.id, target_user.id)
-            if message_key in self.user_message_times:
-                del self.user_message_times[message_key]
+        # Lift the mute (this also clears the user's message history)
+        if await self.state.unmute(state, target_id):
+            if target_id not in state.admins:
+                await self._lift_restriction(context.bot, chat.id, target_id)
             
-            await update.message.reply_text(f"✅ کاربر <b>{target_user.first_name or 'کاربر'}</b> از سکوت درآمد!",
+            await update.message.reply_text(f"✅ کاربر <b>{target_name}</b> از سکوت درآمد!",
                                           parse_mode=ParseMode.HTML)
-            logger.info(f"User {target_user.id} unmuted by admin {user.id} in chat {chat.id}")
+            logger.info(f"User {target_id} unmuted by admin {user.id} in chat {chat.id}")
         else:
-            await update.message.reply_text(f"❌ کاربر <b>{target_user.first_name or 'کاربر'}</b> در حال حاضر سکوت نیست!",
+            await update.message.reply_text(f"❌ کاربر <b>{target_name}</b> در حال حاضر سکوت نیست!",
                                           parse_mode=ParseMode.HTML)
     
     async def spam_mode_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -366,20 +544,15 @@ class AdminGroupBot:
         chat = update.effective_chat
         user = update.effective_user
         
-        # Check if in group
-        if chat.type not in ["group", "supergroup"]:
-            await update.message.reply_text("❌ این دستور فقط در گروه‌ها قابل استفاده است!")
-            return
-        
         # Check if user is admin
-        if user.id not in self.group_admins.get(chat.id, []):
-            await update.message.reply_text("❌ فقط ادمین‌ها می‌توانند از این دستور استفاده کنند!")
+        state = await self._authorize_admin(update, context)
+        if state is None:
             return
         
         # Toggle spam mode
-        current_mode = self.spam_mode_enabled.get(chat.id, False)
-        self.spam_mode_enabled[chat.id] = not current_mode
-        new_mode = self.spam_mode_enabled[chat.id]
+        state.spam_mode = not state.spam_mode
+        await self.state.save_settings(state)
+        new_mode = state.spam_mode
         
         if new_mode:
             await update.message.reply_text(
@@ -398,6 +571,142 @@ class AdminGroupBot:
             )
             logger.info(f"Spam mode disabled for admins in chat {chat.id} by user {user.id}")
     
+    async def spam_limit_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show or set this group's flood thresholds (admin only)"""
+        chat = update.effective_chat
+        user = update.effective_user
+        
+        # Check if user is admin
+        state = await self._authorize_admin(update, context)
+        if state is None:
+            return
+        
+        if context.args:
+            try:
+                threshold, window_seconds = int(context.args[0]), int(context.args[1])
+                # Each tracked user holds a window of threshold + 1 timestamps, so keep it bounded
+                if not (1 <= threshold <= 1000 and 1 <= window_seconds <= 3600):
+                    raise ValueError
+            except (IndexError, ValueError):
+                await update.message.reply_text(
+                    "❌ استفاده: <code>/spam_limit تعداد_پیام ثانیه</code>\n"
+                    "مثال: <code>/spam_limit 10 60</code> (حداکثر 1000 پیام و 3600 ثانیه)",
+                    parse_mode=ParseMode.HTML
+                )
+                return
+            state.spam_limits = (threshold, window_seconds)
+            await self.state.save_settings(state)
+            logger.info(f"Spam limit set to {threshold} messages / {window_seconds}s in chat {chat.id} by user {user.id}")
+        
+        threshold, window_seconds = self.spam_detector.limits(state)
+        await update.message.reply_text(
+            f"🛡️ <b>محدودیت ضد اسپم</b>\n\n"
+            f"بیش از {threshold} پیام در {int(window_seconds)} ثانیه = "
+            f"{Config.MUTE_DURATION_MINUTES} دقیقه سکوت",
+            parse_mode=ParseMode.HTML
+        )
+    
+    async def merge_mode_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show or set how long a user's consecutive texts are collected into one repost (admin only)"""
+        chat = update.effective_chat
+        user = update.effective_user
+        
+        # Check if user is admin
+        state = await self._authorize_admin(update, context)
+        if state is None:
+            return
+        
+        if context.args:
+            argument = context.args[0].lower()
+            try:
+                if argument == "on":
+                    window = Config.MERGE_WINDOW_SECONDS
+                elif argument == "off":
+                    window = 0
+                else:
+                    window = int(argument)
+                    if not 0 <= window <= 60:
+                        raise ValueError
+            except ValueError:
+                await update.message.reply_text(
+                    "❌ استفاده: <code>/merge_mode on|off|ثانیه</code>\n"
+                    "مثال: <code>/merge_mode 5</code> (حداکثر 60 ثانیه)",
+                    parse_mode=ParseMode.HTML
+                )
+                return
+            state.merge_window = window
+            await self.state.save_settings(state)
+            logger.info(f"Merge window set to {window}s in chat {chat.id} by user {user.id}")
+        
+        if state.merge_window:
+            await update.message.reply_text(
+                f"🧩 <b>ادغام پیام‌ها فعال است</b>\n\n"
+                f"پیام‌های متنی پشت سر هم هر کاربر تا {state.merge_window} ثانیه جمع و در یک پیام ارسال می‌شوند\n"
+                f"⚠️ برای غیرفعال کردن: <code>/merge_mode off</code>",
+                parse_mode=ParseMode.HTML
+            )
+        else:
+            await update.message.reply_text(
+                "🧩 <b>ادغام پیام‌ها غیرفعال است</b>\n\n"
+                "هر پیام جداگانه ارسال می‌شود\n"
+                "برای فعال کردن: <code>/merge_mode on</code>",
+                parse_mode=ParseMode.HTML
+            )
+    
+    async def filter_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show or change this group's blocked words and link policy (admin only)"""
+        chat = update.effective_chat
+        user = update.effective_user
+        
+        # Check if user is admin
+        state = await self._authorize_admin(update, context)
+        if state is None:
+            return
+        
+        content_filter = state.content_filter
+        action = context.args[0].lower() if context.args else None
+        # Words and phrases are separated by commas
+        words = {normalize(word) for word in re.split(r"[,،]", " ".join(context.args[1:]))} - {""}
+        
+        if action == "add" and words:
+            patterns = content_filter.patterns | words
+            if len(patterns) > Config.FILTER_MAX_WORDS:
+                await update.message.reply_text(
+                    f"❌ حداکثر {Config.FILTER_MAX_WORDS} کلمه ممنوع برای هر گروه مجاز است",
+                    parse_mode=ParseMode.HTML
+                )
+                return
+            content_filter.set_patterns(patterns)
+        elif action == "remove" and words:
+            content_filter.set_patterns(content_filter.patterns - words)
+        elif action == "links" and len(context.args) == 2 and context.args[1].lower() in LINK_MODES:
+            content_filter.link_mode = LINK_MODES[context.args[1].lower()]
+        elif action is not None:
+            await update.message.reply_text(
+                "❌ استفاده:\n"
+                "<code>/filter add کلمه۱, عبارت دو</code>\n"
+                "<code>/filter remove کلمه۱</code>\n"
+                "<code>/filter links off|invites|all</code>",
+                parse_mode=ParseMode.HTML
+            )
+            return
+        
+        if action is not None:
+            await self.state.save_filter(state)
+            logger.info(f"Content filter changed in chat {chat.id} by user {user.id}: "
+                        f"{len(content_filter.patterns)} words, link mode {content_filter.link_mode}")
+        
+        link_labels = {0: "غیرفعال", 1: "فقط لینک‌های دعوت تلگرام", 2: "همه لینک‌ها"}
+        words_text = "، ".join(html.escape(word) for word in sorted(content_filter.patterns)[:50]) or "—"
+        if len(content_filter.patterns) > 50:
+            words_text += " ..."
+        await update.message.reply_text(
+            f"🚫 <b>فیلتر محتوا</b>\n\n"
+            f"🔗 <b>حذف لینک:</b> {link_labels[content_filter.link_mode]}\n"
+            f"📝 <b>کلمات ممنوع ({len(content_filter.patterns)}):</b> {words_text}",
+            parse_mode=ParseMode.HTML
+        )
+    
     async def handle_group_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle messages in groups - delete non-admin messages and repost them"""
         chat = update.effective_chat
@@ -408,303 +717,368 @@ class AdminGroupBot:
         if chat.type not in ["group", "supergroup"]:
             return
         
+        state = await self._group_state(chat.id, context.bot)
+        
         # Skip if user is admin
-        if user.id in self.group_admins.get(chat.id, []):
+        if user.id in state.admins:
             return
         
         # Skip if message is from bot itself
         if user.id == context.bot.id:
             return
         
-        # Add to processing queue to prevent conflicts
-        if chat.id not in self.processing_queues:
-            self.processing_queues[chat.id] = asyncio.Queue()
-            self.processing_locks[chat.id] = asyncio.Lock()
-        
-        # Add message to queue
-        await self.processing_queues[chat.id].put((update, context))
-        
-        # Process queue if not already processing (with lock)
-        if self.processing_queues[chat.id].qsize() == 1:
-            # Use create_task for non-blocking execution
-            asyncio.create_task(self._process_message_queue(chat.id))
-    
-    def _is_user_muted(self, chat_id: int, user_id: int) -> bool:
-        """Check if user is currently muted"""
-        mute_key = (chat_id, user_id)
-        if mute_key in self.muted_users:
-            mute_until = self.muted_users[mute_key]
-            if datetime.now().timestamp() < mute_until:
-                return True
-            else:
-                # Mute expired, remove from dict
-                del self.muted_users[mute_key]
-        return False
-    
-    def _check_spam(self, chat_id: int, user_id: int) -> bool:
-        """Check if user is spamming and mute if necessary"""
-        current_time = datetime.now().timestamp()
-        message_key = (chat_id, user_id)
-        
-        # Initialize message times list if not exists
-        if message_key not in self.user_message_times:
-            self.user_message_times[message_key] = []
-        
-        # Add current message time
-        self.user_message_times[message_key].append(current_time)
-        
-        # Keep only messages from last 60 seconds
-        cutoff_time = current_time - 60
-        self.user_message_times[message_key] = [
-            msg_time for msg_time in self.user_message_times[message_key] 
-            if msg_time > cutoff_time
-        ]
+        # Hand over to the chat's worker; waits only if that worker is backlogged
+        await self.workers.submit(chat.id, (update, context))
+    
+    async def handle_edited_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Queue edits of members' messages behind the chat's pending reposts"""
+        chat = update.effective_chat
+        user = update.effective_user
         
-        # Check if user sent more than 10 messages in last 60 seconds
-        if len(self.user_message_times[message_key]) > 10:
-            # Mute user for 30 minutes (1800 seconds)
-            mute_until = current_time + 1800
-            self.muted_users[(chat_id, user_id)] = mute_until
-            
-            # Clear message history
-            self.user_message_times[message_key] = []
-            
-            logger.warning(f"User {user_id} muted for spam in chat {chat_id} until {datetime.fromtimestamp(mute_until)}")
-            return True
+        # Admins' messages are never reposted, and neither are the bot's own
+        if user is None or user.id == context.bot.id or user.id in self._admins(chat.id):
+            return
         
-        return False
-
-    async def _process_message_queue(self, chat_id: int):
-        """Process messages in queue one by one to prevent conflicts"""
-        async with self.processing_locks[chat_id]:
-            while not self.processing_queues[chat_id].empty():
-                try:
-                    update, context = await self.processing_queues[chat_id].get()
-                    # Add small delay to ensure proper sequencing
-                    await asyncio.sleep(0.05)
-                    await self._process_single_message(update, context)
-                    self.processing_queues[chat_id].task_done()
-                except Exception as e:
-                    logger.error(f"Error processing message in queue for chat {chat_id}: {e}")
-                    # Mark task as done even if failed
-                    try:
-                        self.processing_queues[chat_id].task_done()
-                    except ValueError:
-                        pass
+        await self.workers.submit(chat.id, (update, context))
+    
+    async def _chat_state(self, chat_id: int) -> ChatState:
+        """Get a chat's state, re-reading admins and settings from the backend when stale"""
+        state = self.chats.get_or_create(chat_id)
+        now = time.monotonic()
+        if state.synced_at is None or now - state.synced_at >= Config.STATE_SYNC_INTERVAL:
+            # Mark first so concurrent callers don't all hit the backend
+            state.synced_at = now
+            await self.state.load_chat(state)
+        return state
+    
+    async def _group_state(self, chat_id: int, bot) -> ChatState:
+        """Chat state for message handling; admins of a group seen for the first time are fetched right away"""
+        state = await self._chat_state(chat_id)
+        if state.admins_due is None:
+            # Not fetched by this process yet: the list may be missing, partial (built from chat_member
+            # updates) or loaded from a shared store, and the background refresh only visits scheduled chats
+            await self._refresh_group_admins(chat_id, bot)
+        return state
+    
+    def _admins(self, chat_id: int) -> frozenset:
+        """Admin ids of a chat (empty if unknown)"""
+        state = self.chats.get(chat_id)
+        return state.admins if state is not None else frozenset()
+    
+    def _delete(self, message):
+        """Queue a message for deletion; it goes out with the chat's next deleteMessages batch"""
+        self.deleter.delete(message.chat_id, message.message_id)
+    
+    async def _restrict_user(self, bot, chat_id: int, user_id: int, mute_until: float) -> bool:
+        """Mute a user through chat permissions so Telegram drops their messages for us"""
+        try:
+            await self.scheduler.submit(
+                chat_id, LANE_DELETE, bot.restrict_chat_member,
+                chat_id=chat_id,
+                user_id=user_id,
+                permissions=ChatPermissions.no_permissions(),
+                until_date=int(mute_until)
+            )
+            return True
+        except TelegramError as e:
+            # Missing "ban users" right: fall back to deleting every message they send
+            logger.warning(f"Could not restrict user {user_id} in chat {chat_id}: {e}")
+            return False
+    
+    async def _lift_restriction(self, bot, chat_id: int, user_id: int) -> bool:
+        """Give a muted user back the group's default permissions"""
+        try:
+            chat = await bot.get_chat(chat_id)
+            permissions = chat.permissions or ChatPermissions.all_permissions()
+            await bot.restrict_chat_member(chat_id, user_id, permissions)
+            return True
+        except TelegramError as e:
+            logger.warning(f"Could not lift restriction of user {user_id} in chat {chat_id}: {e}")
+            return False
+    
+    async def _process_queued_message(self, item):
+        """Worker entry point; returns what waits on the outbound scheduler as the chat's continuation"""
+        if isinstance(item, Album):
+            return lambda: self._process_album(item)
+        if isinstance(item, Burst):
+            # Still open unless a later message of the chat already closed it
+            if self.bursts.take(item.chat_id, item) is not None:
+                return lambda: self._process_burst(item)
+            return None
+        update, context = item
+        if update.edited_message:
+            # Needs the repost ids of the chat's earlier messages, so it runs in the chain
+            return lambda: self._process_edit(update, context)
+        return await self._process_single_message(update, context)
     
     async def _process_single_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Process a single message with ultra-fast optimization"""
+        """Run a message's state checks on the worker; the repost is returned as a continuation.
+        
+        Spam and mute checks, the content filter and burst and album collection
+        depend on the order of the chat's messages and never wait on Telegram's
+        rate limits. Everything that does is left to the continuation.
+        """
         chat = update.effective_chat
         user = update.effective_user
         message = update.message
+        # Structured fields for JSON logs
+        log_ids = {"chat_id": chat.id, "user_id": user.id, "update_id": update.update_id,
+                   "message_id": message.message_id}
         
         try:
             # Check if user is admin and spam mode is disabled for admins
-            is_admin = user.id in self.group_admins.get(chat.id, [])
-            spam_mode_for_admins = self.spam_mode_enabled.get(chat.id, False)
+            state = await self._chat_state(chat.id)
+            is_admin = user.id in state.admins
             
-            if is_admin and not spam_mode_for_admins:
+            if is_admin and not state.spam_mode:
                 # Admin users with spam mode disabled - skip spam detection
                 pass
             else:
                 # Non-admin users OR admins with spam mode enabled - check for spam
+                current_time = datetime.now().timestamp()
+                muted, spamming = await self.state.record_message(state, user.id, current_time)
+                
                 # Check if user is muted
-                if self._is_user_muted(chat.id, user.id):
-                    await message.delete()
-                    logger.info(f"Deleted message from muted user {user.id} in chat {chat.id}")
+                if muted:
+                    self._delete(message)
+                    logger.info("Deleted message from muted user %s in chat %s", user.id, chat.id,
+                                extra={**log_ids, "sampled": True})
                     return
                 
                 # Check for spam
-                if self._check_spam(chat.id, user.id):
-                    await message.delete()
-                    # Send mute notification
-                    user_type = "ادمین" if is_admin else "کاربر"
-                    await context.bot.send_message(
-                        chat_id=chat.id,
-                        text=f"⚠️ {user_type} <b>{user.first_name or 'کاربر'}</b> به دلیل اسپم به مدت 30 دقیقه سکوت شد!",
-                        parse_mode=ParseMode.HTML
-                    )
-                    logger.info(f"User {user.id} ({'admin' if is_admin else 'user'}) muted for spam in chat {chat.id}")
-                    return
+                if spamming:
+                    mute_until = current_time + Config.MUTE_DURATION_MINUTES * 60
+                    await self.state.mute(state, user.id, mute_until, Config.MUTED_USERS_PER_CHAT)
+                    logger.warning(f"User {user.id} muted for spam in chat {chat.id} until {datetime.fromtimestamp(mute_until)}",
+                                   extra=log_ids)
+                    
+                    self._delete(message)
+                    return lambda: self._announce_mute(context.bot, chat.id, user, is_admin, mute_until)
             
-            # Get user display name (only name, no ID) - with caching
-            if user.id in self.user_name_cache:
-                user_name = self.user_name_cache[user.id]
-            else:
-                user_name = user.first_name or "کاربر"
-                if user.last_name:
-                    user_name += f" {user.last_name}"
-                # Cache the name for future use
-                self.user_name_cache[user.id] = user_name
+            # Blocked words and links are removed instead of reposted
+            reason = state.content_filter.check(message)
+            if reason is not None:
+                self._delete(message)
+                CONTENT_FILTERED.labels(reason).inc()
+                logger.info("Removed message from user %s in chat %s by content filter (%s)", user.id, chat.id, reason,
+                            extra={**log_ids, "sampled": True})
+                return
+            
+            user_name = self._user_name(user)
+            
+            # A burst being collected goes out before anything posted after it
+            burst = self.bursts.open_for(chat.id)
+            if message.text and state.merge_window and self.bursts.accepting:
+                closed = None
+                if burst is not None and burst.user_id != user.id:
+                    closed = self.bursts.take(chat.id)
+                self.bursts.add(message, context, user_name, state.merge_window)
+                # Text is re-sent rather than copied, so the original can go right away
+                self._delete(message)
+                return self._burst_continuation(closed)
+            closed = self.bursts.take(chat.id) if burst is not None else None
             
-            # Fast message type detection
-            message_type = "پیام"
-            media_to_forward = None
+            if not message.text:
+                entry = content_type(message)
+                if entry is None:
+                    # Service messages and other content that can't be reposted
+                    return self._burst_continuation(closed)
+                if message.media_group_id and entry[0] in ALBUM_MEDIA and self.albums.accepting:
+                    # Reposted together with the rest of the album once all parts arrived
+                    self.albums.add(message, context, user_name)
+                    return self._burst_continuation(closed)
+            
+            return lambda: self._repost_message(update, context, state, user_name, closed)
+            
+        except TelegramError as e:
+            logger.error(f"Error handling message from user {user.id} in chat {chat.id}: {e}", extra=log_ids)
+        except Exception as e:
+            logger.error(f"Unexpected error handling message: {e}", extra=log_ids)
+    
+    def _burst_continuation(self, burst: Burst):
+        """Continuation reposting a burst that was just closed, if any"""
+        if burst is None:
+            return None
+        return lambda: self._process_burst(burst)
+    
+    async def _announce_mute(self, bot, chat_id: int, user, is_admin: bool, mute_until: float):
+        """Restrict a user muted for flooding (if possible) and tell the group"""
+        restricted = False
+        if not is_admin:
+            # Administrators can't be restricted; their mute stays delete-based
+            restricted = await self._restrict_user(bot, chat_id, user.id, mute_until)
+        MUTES.labels("restricted" if restricted else "delete_only").inc()
+        # Send mute notification
+        user_type = "ادمین" if is_admin else "کاربر"
+        try:
+            await self.scheduler.submit(
+                chat_id, LANE_NOTICE, bot.send_message,
+                chat_id=chat_id,
+                text=f"⚠️ {user_type} <b>{user.first_name or 'کاربر'}</b> به دلیل اسپم به مدت {Config.MUTE_DURATION_MINUTES} دقیقه سکوت شد!\n"
+                     f"🆔 <code>{user.id}</code>",
+                parse_mode=ParseMode.HTML
+            )
+        except TelegramError as e:
+            logger.error(f"Could not announce mute of user {user.id} in chat {chat_id}: {e}")
+    
+    async def _repost_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, state: ChatState,
+                              user_name: str, burst: Burst = None):
+        """Repost a message that passed the checks, after the burst it closed"""
+        chat = update.effective_chat
+        user = update.effective_user
+        message = update.message
+        log_ids = {"chat_id": chat.id, "user_id": user.id, "update_id": update.update_id,
+                   "message_id": message.message_id}
+        
+        if burst is not None:
+            await self._process_burst(burst)
+        
+        try:
+            # Replies to an already reposted message are threaded onto the repost
+            reply_to_message_id = None
+            if message.reply_to_message:
+                reply_to_message_id = state.reply_target(message.reply_to_message.message_id)
             
             if message.text:
                 message_type = "متن"
-                # Get reply message ID if exists
-                reply_to_message_id = message.reply_to_message.message_id if message.reply_to_message else None
-                
-                # Delete and send text simultaneously
-                await asyncio.gather(
-                    message.delete(),
-                    context.bot.send_message(
-                        chat_id=chat.id,
-                        text=f"<b>{user_name}:</b>\n{message.text}",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                )
-            elif message.sticker:
-                message_type = "استیکر"
-                media_to_forward = message.sticker
-            elif message.photo:
-                message_type = "عکس"
-                media_to_forward = message.photo[-1]
-            elif message.video:
-                message_type = "ویدیو"
-                media_to_forward = message.video
-            elif message.voice:
-                message_type = "صدا"
-                media_to_forward = message.voice
-            elif message.video_note:
-                message_type = "ویدیو نوت"
-                media_to_forward = message.video_note
-            elif message.document:
-                message_type = "فایل"
-                media_to_forward = message.document
-            elif message.audio:
-                message_type = "آهنگ"
-                media_to_forward = message.audio
-            elif message.animation:
-                message_type = "گیف"
-                media_to_forward = message.animation
-            elif message.contact:
-                message_type = "مخاطب"
-                media_to_forward = message.contact
-            elif message.location:
-                message_type = "موقعیت"
-                media_to_forward = message.location
-            elif message.poll:
-                message_type = "نظرسنجی"
-                media_to_forward = message.poll
+                # Text is re-sent rather than copied, so the deletion is queued right away
+                self._delete(message)
+                repost_id = await timed(REPOST_LATENCY.labels("text"),
+                                        self.repost_engine.repost(context.bot, message, user_name, reply_to_message_id))
             else:
-                message_type = "رسانه"
+                entry = content_type(message)
+                message_type = entry[1]
+                # copyMessage needs the original, so delete only after the copy
+                try:
+                    repost_id = await timed(REPOST_LATENCY.labels(entry[0]),
+                                            self.repost_engine.repost(context.bot, message, user_name, reply_to_message_id))
+                except TelegramError as e:
+                    # Deleting now would lose the only copy of the media
+                    logger.error(f"Could not repost {entry[0]} {message.message_id} of user {user.id} "
+                                 f"in chat {chat.id}, keeping the original: {e}", extra=log_ids)
+                    return
+                self._delete(message)
             
-            # For media messages, process based on type
-            if media_to_forward:
-                # Get reply message ID if exists
-                reply_to_message_id = message.reply_to_message.message_id if message.reply_to_message else None
-                
-                # First delete the original message
-                await message.delete()
-                
-                # For stickers: send name + sticker separately (2 messages)
-                if message.sticker:
-                    # Send name message first
-                    await context.bot.send_message(
-                        chat_id=chat.id,
-                        text=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                    # Then send sticker
-                    await context.bot.send_sticker(
-                        chat_id=chat.id,
-                        sticker=media_to_forward,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                
-                # For other media: send with caption in one message
-                elif message.photo:
-                    await context.bot.send_photo(
-                        chat_id=chat.id,
-                        photo=media_to_forward,
-                        caption=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.video:
-                    await context.bot.send_video(
-                        chat_id=chat.id,
-                        video=media_to_forward,
-                        caption=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.voice:
-                    await context.bot.send_voice(
-                        chat_id=chat.id,
-                        voice=media_to_forward,
-                        caption=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.video_note:
-                    # Video notes can't have captions, so use 2 messages
-                    await context.bot.send_message(
-                        chat_id=chat.id,
-                        text=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                    await context.bot.send_video_note(
-                        chat_id=chat.id,
-                        video_note=media_to_forward,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.document:
-                    await context.bot.send_document(
-                        chat_id=chat.id,
-                        document=media_to_forward,
-                        caption=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.audio:
-                    await context.bot.send_audio(
-                        chat_id=chat.id,
-                        audio=media_to_forward,
-                        caption=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.animation:
-                    await context.bot.send_animation(
-                        chat_id=chat.id,
-                        animation=media_to_forward,
-                        caption=f"<b>{user_name}:</b>",
-                        parse_mode=ParseMode.HTML,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.contact:
-                    await context.bot.send_contact(
-                        chat_id=chat.id,
-                        contact=media_to_forward,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.location:
-                    await context.bot.send_location(
-                        chat_id=chat.id,
-                        location=media_to_forward,
-                        reply_to_message_id=reply_to_message_id
-                    )
-                elif message.poll:
-                    await context.bot.send_poll(
-                        chat_id=chat.id,
-                        question=media_to_forward.question,
-                        options=[option.text for option in media_to_forward.options],
-                        is_anonymous=media_to_forward.is_anonymous,
-                        reply_to_message_id=reply_to_message_id
-                    )
+            if repost_id is not None:
+                state.remember_repost(message.message_id, repost_id, Config.REPOST_INDEX_PER_CHAT)
             
-            logger.info(f"Ultra-fast processed {message_type} from {user_name} in chat {chat.id}")
+            # Per-message success line; only LOG_SAMPLE_RATE of these are kept
+            logger.info("Processed %s from %s in chat %s", message_type, user_name, chat.id,
+                        extra={**log_ids, "sampled": True})
             
         except TelegramError as e:
-            logger.error(f"Error handling message from user {user.id} in chat {chat.id}: {e}")
+            logger.error(f"Error handling message from user {user.id} in chat {chat.id}: {e}", extra=log_ids)
         except Exception as e:
-            logger.error(f"Unexpected error handling message: {e}")
+            logger.error(f"Unexpected error handling message: {e}", extra=log_ids)
+    
+    async def _process_burst(self, burst: Burst):
+        """Repost a user's collected texts as one message"""
+        chat_id = burst.chat_id
+        first = burst.messages[0]
+        
+        try:
+            state = await self._chat_state(chat_id)
+            reply_to_message_id = None
+            if first.reply_to_message:
+                reply_to_message_id = state.reply_target(first.reply_to_message.message_id)
+            
+            repost_ids = await timed(REPOST_LATENCY.labels("burst"), self.repost_engine.repost_burst(
+                burst.context.bot, burst.messages, burst.user_name, reply_to_message_id
+            ))
+            for message, repost_id in zip(burst.messages, repost_ids):
+                state.remember_repost(message.message_id, repost_id, Config.REPOST_INDEX_PER_CHAT)
+            logger.info("Processed %s merged texts from %s in chat %s", len(burst.messages), burst.user_name, chat_id,
+                        extra={"chat_id": chat_id, "user_id": burst.user_id, "message_id": first.message_id,
+                               "sampled": True})
+        except TelegramError as e:
+            logger.error(f"Error reposting merged texts of user {burst.user_id} in chat {chat_id}: {e}")
+    
+    async def _process_album(self, album: Album):
+        """Repost a collected album as one media group, then queue the reposted parts for deletion"""
+        chat_id = album.chat_id
+        bot = album.context.bot
+        first = album.messages[0]
+        
+        try:
+            state = await self._chat_state(chat_id)
+            reply_to_message_id = None
+            if first.reply_to_message:
+                reply_to_message_id = state.reply_target(first.reply_to_message.message_id)
+            
+            repost_ids, grouped = await timed(REPOST_LATENCY.labels("album"), self.repost_engine.repost_album(
+                bot, album.messages, album.user_name, reply_to_message_id
+            ))
+            
+            # Parts that couldn't be reposted stay in the chat rather than being lost
+            for index, (message, repost_id) in enumerate(zip(album.messages, repost_ids)):
+                if repost_id is None:
+                    logger.error(f"Could not repost album part {message.message_id} in chat {chat_id}, keeping the original")
+                    continue
+                self._delete(message)
+                # A media group carries the name on its first item only
+                state.remember_repost(message.message_id, repost_id, Config.REPOST_INDEX_PER_CHAT,
+                                      named=not grouped or index == 0)
+            logger.info("Processed album of %s from %s in chat %s", len(album.messages), album.user_name, chat_id,
+                        extra={"chat_id": chat_id, "user_id": first.from_user.id, "message_id": first.message_id,
+                               "sampled": True})
+        except TelegramError as e:
+            logger.error(f"Could not repost album {album.media_group_id} (messages "
+                         f"{[message.message_id for message in album.messages]}) in chat {chat_id}, "
+                         f"keeping the originals: {e}")
+    
+    async def _process_edit(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Apply an edit to the repost of the original message, if it is still indexed"""
+        chat = update.effective_chat
+        user = update.effective_user
+        message = update.edited_message
+        
+        state = self.chats.get(chat.id)
+        repost_id = state.reposts.get(message.message_id) if state is not None else None
+        if repost_id is None:
+            # Never reposted (spam, unsupported content) or already evicted from the index
+            return
+        if list(state.reposts.values()).count(repost_id) > 1:
+            # Merged with other texts; replacing the repost's text would drop them
+            return
+        
+        # An edit can't sneak in what the content filter would have removed
+        reason = state.content_filter.check(message)
+        if reason is not None:
+            state.forget_repost(message.message_id)
+            self.deleter.delete(chat.id, repost_id)
+            CONTENT_FILTERED.labels(reason).inc()
+            logger.info("Removed repost %s of edited message from user %s in chat %s by content filter (%s)",
+                        repost_id, user.id, chat.id, reason,
+                        extra={"chat_id": chat.id, "user_id": user.id, "update_id": update.update_id,
+                               "message_id": message.message_id, "sampled": True})
+            return
+        
+        try:
+            if await self.repost_engine.edit(context.bot, message, self._user_name(user), repost_id,
+                                             named=repost_id not in state.unnamed_reposts):
+                logger.info("Applied edit of message %s to repost %s in chat %s", message.message_id, repost_id, chat.id,
+                            extra={"chat_id": chat.id, "user_id": user.id, "update_id": update.update_id,
+                                   "message_id": message.message_id, "sampled": True})
+        except TelegramError as e:
+            logger.warning(f"Could not apply edit to repost {repost_id} in chat {chat.id}: {e}")
+    
+    def _user_name(self, user) -> str:
+        """User display name (only name, no ID) - with caching"""
+        user_name = self.user_name_cache.get(user.id)
+        if user_name is not None:
+            CACHE_LOOKUPS.labels("user_name", "hit").inc()
+            return user_name
+        CACHE_LOOKUPS.labels("user_name", "miss").inc()
+        user_name = user.first_name or "کاربر"
+        if user.last_name:
+            user_name += f" {user.last_name}"
+        # Cache the name for future use
+        self.user_name_cache[user.id] = user_name
+        return user_name
+    
+    async def handle_name_button(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Acknowledge taps on a repost's author-name button"""
+        await update.callback_query.answer()
     
     async def handle_new_chat_members(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle new chat members"""
@@ -732,10 +1106,45 @@ class AdminGroupBot:
         
         # Check if bot was removed from the group
         if left_member.id == context.bot.id:
-            # Clean up admin list for this chat
-            if chat.id in self.group_admins:
-                del self.group_admins[chat.id]
-                logger.info(f"Cleaned up admin list for chat {chat.id} after bot removal")
+            await self._forget_chat(chat.id)
+    
+    async def _forget_chat(self, chat_id: int):
+        """Clean up all state for a chat the bot is no longer in"""
+        self.chats.pop(chat_id)
+        await self.state.forget_chat(chat_id)
+        logger.info(f"Cleaned up state for chat {chat_id} after bot removal")
+    
+    async def handle_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Apply a promotion or demotion to the cached admin list"""
+        change = update.chat_member
+        user_id = change.new_chat_member.user.id
+        was_admin = change.old_chat_member.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]
+        is_admin = change.new_chat_member.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]
+        if was_admin == is_admin:
+            # Joins, leaves and restrictions of regular members
+            return
+        
+        state = await self._chat_state(change.chat.id)
+        if is_admin:
+            state.admins = state.admins | {user_id}
+            state.admin_names[user_id] = self._admin_display_name(change.new_chat_member.user)
+        else:
+            state.admins = state.admins - {user_id}
+            state.admin_names.pop(user_id, None)
+        await self.state.save_admins(state)
+        logger.info(f"User {user_id} {'promoted to' if is_admin else 'removed from'} admins in chat {change.chat.id}")
+    
+    async def handle_my_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """React to the bot being promoted, demoted or removed"""
+        change = update.my_chat_member
+        chat_id = change.chat.id
+        status = change.new_chat_member.status
+        
+        if status in [ChatMemberStatus.LEFT, ChatMemberStatus.BANNED]:
+            await self._forget_chat(chat_id)
+        elif status == ChatMemberStatus.ADMINISTRATOR and change.chat.type in ["group", "supergroup"]:
+            # Now allowed to see chat_member updates; start from a full list
+            await self._refresh_group_admins(chat_id, context.bot)
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
@@ -751,8 +1160,70 @@ class AdminGroupBot:
         except Exception as e:
             logger.error(f"Error sending error message: {e}")
     
+    def _readiness_problems(self) -> list:
+        """Reasons the bot shouldn't receive traffic yet (empty when ready)"""
+        problems = []
+        if not self.ready:
+            problems.append("starting up: admin lists not loaded yet")
+        backlog = sum(self.workers.depths.values())
+        if backlog > Config.READY_MAX_BACKLOG:
+            problems.append(f"{backlog} messages queued (limit {Config.READY_MAX_BACKLOG})")
+        return problems
+    
+    def state_sizes(self) -> dict:
+        """Number of entries held by the in-memory stores"""
+        chats = list(self.chats)
+        return {
+            "chats": len(chats),
+            "dispatching_chats": self.update_processor.busy_chats(),
+            "queued_chats": len(self.workers.depths),
+            "queued_messages": sum(self.workers.depths.values()),
+            "user_name_cache": len(self.user_name_cache),
+            "spam_windows": sum(len(state.spam_windows) for state in chats),
+            "muted_users": sum(len(state.mutes) for state in chats),
+            "repost_index": sum(len(state.reposts) for state in chats),
+            "chat_buckets": len(self.scheduler.chat_buckets),
+            "pending_albums": len(self.albums),
+            "open_bursts": len(self.bursts),
+            "pending_deletes": self.deleter.pending(),
+        }
+    
+    def _sweep_state(self):
+        """Drop expired and idle entries from the in-memory stores"""
+        now = datetime.now().timestamp()
+        expired_mutes = stale_windows = dropped_chats = 0
+        
+        for state in self.chats:
+            for user_id in [user_id for user_id, mute_until in state.mutes.items() if mute_until <= now]:
+                del state.mutes[user_id]
+                expired_mutes += 1
+            stale_windows += self.spam_detector.sweep(state, now)
+            
+            if state.is_disposable() and not self.workers.depth(state.chat_id):
+                self.chats.pop(state.chat_id)
+                dropped_chats += 1
+        
+        expired_names = self.user_name_cache.expire()
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            # state_sizes() walks every chat, so only build it when the line is kept
+            logger.debug(f"State sweep: {expired_mutes} mutes expired, {stale_windows} spam windows, "
+                         f"{expired_names} names, {dropped_chats} empty chats dropped; "
+                         f"sizes {self.state_sizes()}")
+    
+    async def _sweep_state_periodically(self):
+        while True:
+            await asyncio.sleep(Config.STATE_SWEEP_INTERVAL)
+            try:
+                self._sweep_state()
+            except Exception as e:
+                logger.error(f"Error sweeping state: {e}")
+    
     async def post_init(self, application: Application):
-        """Post initialization - set bot commands"""
+        """Post initialization - restore persisted state and set bot commands"""
+        # Warm start: known admin lists avoid deleting admins' messages after a restart
+        await self.state.warm_start(self.chats)
+        
         commands = [
             BotCommand("start", "شروع ربات"),
             BotCommand("help", "راهنمای استفاده"),
@@ -761,20 +1232,94 @@ class AdminGroupBot:
             BotCommand("refresh_admins", "بروزرسانی لیست ادمین‌ها"),
             BotCommand("unmute", "حذف سکوت کاربر (ادمین)"),
             BotCommand("spam_mode", "فعال/غیرفعال کردن ضد اسپم برای ادمین‌ها"),
+            BotCommand("spam_limit", "تنظیم محدودیت ضد اسپم گروه"),
+            BotCommand("merge_mode", "ادغام پیام‌های پشت سر هم کاربران"),
+            BotCommand("filter", "کلمات ممنوع و فیلتر لینک‌ها"),
         ]
         
         await application.bot.set_my_commands(commands)
         logger.info("Bot commands set successfully")
+        
+        self.workers.start()
+        # Webhook intake (webhook mode), health checks and metrics
+        await self.web_server.start()
+        self.health.start()
+        self.sweeper_task = asyncio.create_task(self._sweep_state_periodically())
+        
+        # Spread the refreshes of restored chats over one TTL instead of running them all at once
+        for state in self.chats:
+            self._schedule_admin_refresh(state, random.uniform(0, Config.ADMIN_REFRESH_TTL))
+        self.admin_refresh_task = asyncio.create_task(self._refresh_admins_periodically(application.bot))
+        self.ready = True
+    
+    async def post_stop(self, application: Application):
+        """Post stop - drain queued work while the bot can still send"""
+        self.ready = False
+        self.health.stop()
+        if self.sweeper_task is not None:
+            self.sweeper_task.cancel()
+        if self.admin_refresh_task is not None:
+            self.admin_refresh_task.cancel()
+        await self.web_server.stop()
+        # Application.shutdown() closes the bot's HTTP client, so this has to run before it
+        await self.albums.flush()
+        await self.bursts.flush()
+        await self.workers.stop()
+        await self.deleter.flush()
+    
+    async def post_shutdown(self, application: Application):
+        """Post shutdown - stop the dispatcher and close the state store"""
+        await self.scheduler.stop()
+        await self.state.close()
     
     def run(self):
         """Run the bot"""
         logger.info("Starting Admin Group Bot...")
         
-        # Add post_init callback
+        # Add lifecycle callbacks
         self.application.post_init = self.post_init
+        self.application.post_stop = self.post_stop
+        self.application.post_shutdown = self.post_shutdown
         
         # Run the bot
-        self.application.run_polling()
+        if Config.BOT_MODE == "webhook":
+            asyncio.run(self._run_webhook())
+        else:
+            # chat_member updates are only delivered when requested explicitly
+            self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    async def _run_webhook(self):
+        """Receive updates through the webhook server until interrupted"""
+        if not Config.WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL must be set when BOT_MODE is 'webhook'")
+        
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C surfaces as KeyboardInterrupt instead
+                pass
+        
+        async with self.application:
+            # post_init and post_stop are only invoked automatically by run_polling/run_webhook
+            await self.post_init(self.application)
+            await self.application.start()
+            try:
+                await self.application.bot.set_webhook(
+                    url=Config.WEBHOOK_URL,
+                    secret_token=self.web_server.secret_token,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+                )
+                logger.info(f"Webhook set to {Config.WEBHOOK_URL}")
+                await stop_event.wait()
+            finally:
+                await self.web_server.stop()
+                await self.application.stop()
+                await self.post_stop(self.application)
+        await self.post_shutdown(self.application)
 
 if __name__ == "__main__":
     bot = AdminGroupBot()
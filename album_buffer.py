@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Album:
+    """Parts of one media group, in arrival order"""
+
+    __slots__ = ("chat_id", "media_group_id", "messages", "context", "user_name")
+
+    def __init__(self, chat_id: int, media_group_id: str, context, user_name: str):
+        self.chat_id = chat_id
+        self.media_group_id = media_group_id
+        self.messages = []
+        self.context = context
+        self.user_name = user_name
+
+
+class AlbumBuffer:
+    """Collects the parts of media groups so each album is handled once.
+
+    Telegram delivers an album as one update per item, milliseconds apart.
+    An album is released to `on_complete` once no new part arrived for
+    `wait` seconds, or right away when it reaches `max_items` (Telegram's
+    album limit). After `flush()` the buffer stops accepting parts.
+    """
+
+    def __init__(self, on_complete, wait: float = 1.0, max_items: int = 10):
+        self.on_complete = on_complete  # async callable(Album)
+        self.wait = wait
+        self.max_items = max_items
+        self.accepting = True
+        self._albums = {}  # (chat_id, media_group_id) -> Album
+        self._timers = {}  # (chat_id, media_group_id) -> asyncio.TimerHandle
+        self._tasks = set()
+
+    def add(self, message, context, user_name: str):
+        key = (message.chat_id, message.media_group_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = Album(message.chat_id, message.media_group_id, context, user_name)
+        album.messages.append(message)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if len(album.messages) >= self.max_items:
+            self._release(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.wait, self._release, key)
+
+    def _release(self, key):
+        self._timers.pop(key, None)
+        album = self._albums.pop(key)
+        task = asyncio.create_task(self._complete(album))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _complete(self, album: Album):
+        try:
+            await self.on_complete(album)
+        except Exception as e:
+            logger.error(f"Error handing over album {album.media_group_id} of chat {album.chat_id}: {e}")
+
+    async def flush(self):
+        """Stop accepting parts and release every album still being collected"""
+        self.accepting = False
+        for key in list(self._albums):
+            self._timers[key].cancel()
+            self._release(key)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def __len__(self) -> int:
+        """Albums still being collected"""
+        return len(self._albums)
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Burst:
+    """Consecutive text messages of one user in one chat, in arrival order"""
+
+    __slots__ = ("chat_id", "user_id", "user_name", "messages", "context")
+
+    def __init__(self, chat_id: int, user_id: int, user_name: str, context):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.messages = []
+        self.context = context
+
+
+class BurstBuffer:
+    """Holds the open burst of each chat until it is reposted as one message.
+
+    A chat has at most one open burst. When its window (counted from its
+    first message) has passed, the burst is handed to `on_expire`, which
+    queues it behind the chat's pending messages; it stays open until
+    someone `take`s it. Callers take it earlier when anything else is posted
+    in the chat, so reposts keep the chat's order. After `flush()` the
+    buffer stops accepting messages.
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire  # async callable(Burst)
+        self.accepting = True
+        self._bursts = {}  # chat_id -> Burst
+        self._timers = {}  # chat_id -> asyncio.TimerHandle
+        self._tasks = set()
+
+    def open_for(self, chat_id: int):
+        """The chat's open burst, or None"""
+        return self._bursts.get(chat_id)
+
+    def add(self, message, context, user_name: str, window: float):
+        """Add a text message to the chat's open burst, opening one if needed"""
+        chat_id = message.chat_id
+        burst = self._bursts.get(chat_id)
+        if burst is None:
+            burst = self._bursts[chat_id] = Burst(chat_id, message.from_user.id, user_name, context)
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(window, self._expire, chat_id)
+        burst.messages.append(message)
+
+    def take(self, chat_id: int, burst: Burst = None):
+        """Close and return the chat's open burst; with `burst`, only if that one is still open"""
+        current = self._bursts.get(chat_id)
+        if current is None or (burst is not None and current is not burst):
+            return None
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        return self._bursts.pop(chat_id)
+
+    def _expire(self, chat_id: int):
+        self._timers.pop(chat_id, None)
+        burst = self._bursts[chat_id]
+        task = asyncio.create_task(self._hand_over(burst))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _hand_over(self, burst: Burst):
+        try:
+            await self.on_expire(burst)
+        except Exception as e:
+            logger.error(f"Error handing over burst of user {burst.user_id} in chat {burst.chat_id}: {e}")
+
+    async def flush(self):
+        """Stop accepting messages and hand over every open burst now"""
+        self.accepting = False
+        for chat_id in list(self._bursts):
+            timer = self._timers.get(chat_id)
+            if timer is not None:
+                timer.cancel()
+                self._expire(chat_id)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def __len__(self) -> int:
+        """Open bursts"""
+        return len(self._bursts)
@@ -0,0 +1,87 @@
+from content_filter import ContentFilter
+
+
+class ChatState:
+    """Everything the bot tracks for one group, in a single slotted object"""
+
+    __slots__ = ("chat_id", "admins", "admin_names", "admins_due", "spam_mode", "spam_limits", "spam_windows", "mutes",
+                 "merge_window", "content_filter", "reposts", "unnamed_reposts", "synced_at")
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.admins = frozenset()  # user ids of administrators
+        self.admin_names = {}  # user_id -> display name, filled by the same admin list fetch
+        self.admins_due = None  # monotonic time of the next admin refresh, None if never scheduled
+        self.spam_mode = False  # whether spam detection also applies to admins
+        self.spam_limits = None  # (threshold, window_seconds) override, None for defaults
+        self.spam_windows = {}  # user_id -> SpamWindow
+        self.mutes = {}  # user_id -> mute_until timestamp
+        self.merge_window = 0  # seconds a user's consecutive texts are collected into one repost, 0 = off
+        self.content_filter = ContentFilter()  # blocked words and link policy
+        self.reposts = {}  # original message_id -> repost message_id, oldest first
+        self.unnamed_reposts = set()  # indexed repost ids without the author's name (later album items)
+        self.synced_at = None  # monotonic time of the last load from the state backend
+
+    def mute(self, user_id: int, mute_until: float, max_mutes: int):
+        """Mirror a mute, dropping the oldest one if the chat is at capacity"""
+        self.mutes.pop(user_id, None)
+        if len(self.mutes) >= max_mutes:
+            del self.mutes[next(iter(self.mutes))]
+        self.mutes[user_id] = mute_until
+
+    def remember_repost(self, original_id: int, repost_id: int, max_reposts: int, named: bool = True):
+        """Record where a deleted message was reposted, forgetting the oldest entry at capacity"""
+        if len(self.reposts) >= max_reposts:
+            self.forget_repost(next(iter(self.reposts)))
+        self.reposts[original_id] = repost_id
+        if not named:
+            self.unnamed_reposts.add(repost_id)
+
+    def forget_repost(self, original_id: int):
+        """Drop a message from the repost index"""
+        self.unnamed_reposts.discard(self.reposts.pop(original_id))
+
+    def reply_target(self, message_id: int) -> int:
+        """Id to reply to for a reply to `message_id`: its repost if known, else the message itself"""
+        return self.reposts.get(message_id, message_id)
+
+    def is_muted(self, user_id: int, now: float) -> bool:
+        mute_until = self.mutes.get(user_id)
+        if mute_until is None:
+            return False
+        if now < mute_until:
+            return True
+        # Mute expired
+        del self.mutes[user_id]
+        return False
+
+    def is_disposable(self) -> bool:
+        """True if the state holds nothing worth keeping"""
+        return (not self.admins and not self.mutes and not self.spam_windows
+                and not self.spam_mode and self.spam_limits is None and not self.merge_window
+                and self.content_filter.is_empty())
+
+
+class ChatRegistry:
+    """ChatState objects keyed by chat id"""
+
+    def __init__(self):
+        self._chats = {}  # chat_id -> ChatState
+
+    def get(self, chat_id: int):
+        return self._chats.get(chat_id)
+
+    def get_or_create(self, chat_id: int) -> ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = ChatState(chat_id)
+        return state
+
+    def pop(self, chat_id: int):
+        return self._chats.pop(chat_id, None)
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def __iter__(self):
+        return iter(list(self._chats.values()))
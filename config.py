@@ -7,7 +7,95 @@ load_dotenv()
 class Config:
     # Telegram Bot Configuration
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
+    TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')  # Point at fake_bot_api.py for load tests
     
     # Application Configuration
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
-    TIMEZONE = os.getenv('TIMEZONE', 'Asia/Tehran')
\ No newline at end of file
+    TIMEZONE = os.getenv('TIMEZONE', 'Asia/Tehran')
+    
+    # Update Delivery Configuration ('polling' or 'webhook')
+    BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Public HTTPS URL, e.g. https://example.com/webhook
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+    WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')  # Derived from the bot token if empty
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+    
+    # Web Server Configuration
+    WEB_SERVER_HOST = os.getenv('WEB_SERVER_HOST', '0.0.0.0')
+    WEB_SERVER_PORT = int(os.getenv('WEB_SERVER_PORT', '8000'))
+    
+    # Outbound Rate Limits (Telegram allows ~30 msgs/s overall and ~20 msgs/min per group)
+    GLOBAL_RATE_PER_SECOND = float(os.getenv('GLOBAL_RATE_PER_SECOND', '30'))
+    GLOBAL_BURST = float(os.getenv('GLOBAL_BURST', '30'))
+    CHAT_RATE_PER_MINUTE = float(os.getenv('CHAT_RATE_PER_MINUTE', '20'))
+    CHAT_BURST = float(os.getenv('CHAT_BURST', '3'))  # Burst plus a minute of refill should stay near the group limit
+    MAX_FLOOD_RETRIES = int(os.getenv('MAX_FLOOD_RETRIES', '5'))  # Retries after a 429 before dropping
+    DELETE_BATCH_WINDOW = float(os.getenv('DELETE_BATCH_WINDOW', '0.1'))  # Seconds deletions are collected per deleteMessages call
+    
+    # Logging (LOG_FILE empty = console only; LOG_FORMAT 'text' or 'json')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.getenv('LOG_FILE', '')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # Rotate the file at this size
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))  # Share of per-message success logs kept
+    
+    # Health Checks (/health restarts a wedged bot, /ready gates traffic)
+    HEALTH_MAX_LOOP_LAG = float(os.getenv('HEALTH_MAX_LOOP_LAG', '2'))  # Seconds of event-loop lag before unhealthy
+    HEALTH_MAX_API_SILENCE = int(os.getenv('HEALTH_MAX_API_SILENCE', '300'))  # Seconds without a successful API call
+    HEALTH_PROBE_INTERVAL = int(os.getenv('HEALTH_PROBE_INTERVAL', '60'))  # getMe probe when the bot is quiet
+    READY_MAX_BACKLOG = int(os.getenv('READY_MAX_BACKLOG', '5000'))  # Queued messages before reporting not ready
+    
+    # Metrics (Prometheus, served by the web server on WEB_SERVER_PORT)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+    
+    # HTTP Connections to the Bot API (sending has its own pool; getUpdates uses a separate one)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '64'))  # Parallel requests before callers wait for a connection
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+    HTTP_WRITE_TIMEOUT = float(os.getenv('HTTP_WRITE_TIMEOUT', '10'))
+    HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '5'))  # Seconds to wait for a free connection
+    HTTP_VERSION = os.getenv('HTTP_VERSION', '1.1')  # '2' needs: pip install "python-telegram-bot[http2]"
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))  # Seconds an idle connection is kept open
+    HTTP_TCP_KEEPALIVE = os.getenv('HTTP_TCP_KEEPALIVE', 'True').lower() == 'true'  # TCP keep-alive probes on idle connections
+    GET_UPDATES_POOL_SIZE = int(os.getenv('GET_UPDATES_POOL_SIZE', '2'))
+    
+    # Update Dispatch (updates of different chats run concurrently; one chat's updates run in order)
+    MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '64'))
+    
+    # Message Processing (each chat is handled in order by one of WORKER_COUNT workers)
+    WORKER_COUNT = int(os.getenv('WORKER_COUNT', '16'))
+    WORKER_QUEUE_SIZE = int(os.getenv('WORKER_QUEUE_SIZE', '1000'))  # Per worker; intake waits when full
+    ALBUM_WAIT_SECONDS = float(os.getenv('ALBUM_WAIT_SECONDS', '1.0'))  # Quiet time before an album is reposted
+    MERGE_WINDOW_SECONDS = int(os.getenv('MERGE_WINDOW_SECONDS', '3'))  # Window set by /merge_mode on
+    FILTER_MAX_WORDS = int(os.getenv('FILTER_MAX_WORDS', '500'))  # Blocked words per group
+    
+    # Anti-Spam Configuration
+    SPAM_THRESHOLD_MESSAGES = int(os.getenv('SPAM_THRESHOLD_MESSAGES', '10'))  # More than this many messages...
+    SPAM_WINDOW_SECONDS = int(os.getenv('SPAM_WINDOW_SECONDS', '60'))  # ...within this window is spam
+    MUTE_DURATION_MINUTES = int(os.getenv('MUTE_DURATION_MINUTES', '30'))
+    
+    # Memory Bounds
+    USER_NAME_CACHE_SIZE = int(os.getenv('USER_NAME_CACHE_SIZE', '10000'))
+    USER_NAME_CACHE_TTL = int(os.getenv('USER_NAME_CACHE_TTL', '86400'))  # Seconds before a cached name is refreshed
+    SPAM_TRACKED_USERS_PER_CHAT = int(os.getenv('SPAM_TRACKED_USERS_PER_CHAT', '5000'))
+    MUTED_USERS_PER_CHAT = int(os.getenv('MUTED_USERS_PER_CHAT', '5000'))
+    REPOST_INDEX_PER_CHAT = int(os.getenv('REPOST_INDEX_PER_CHAT', '2000'))  # Recent reposts remembered for reply threading
+    STATE_SWEEP_INTERVAL = int(os.getenv('STATE_SWEEP_INTERVAL', '300'))  # Seconds between cleanup passes
+    
+    # State Backend ('memory' or 'redis' to share state between replicas)
+    STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory').lower()
+    REDIS_URL = os.getenv('REDIS_URL', f"redis://:{os.getenv('REDIS_PASSWORD', '')}@redis:6379/0")
+    REDIS_KEY_PREFIX = os.getenv('REDIS_KEY_PREFIX', 'admin_bot')
+    STATE_SYNC_INTERVAL = int(os.getenv('STATE_SYNC_INTERVAL', '60'))  # Seconds before a chat's admins/settings are re-read
+    
+    # Admin List Maintenance (chat_member updates apply changes instantly; this refresh catches anything missed)
+    ADMIN_REFRESH_TTL = int(os.getenv('ADMIN_REFRESH_TTL', '3600'))  # Seconds before a chat's admin list is re-fetched
+    ADMIN_REFRESH_JITTER = float(os.getenv('ADMIN_REFRESH_JITTER', '0.1'))  # Fraction of the TTL to randomize by
+    ADMIN_REFRESH_CONCURRENCY = int(os.getenv('ADMIN_REFRESH_CONCURRENCY', '5'))  # Parallel getChatAdministrators calls
+    ADMIN_REFRESH_CHECK_INTERVAL = int(os.getenv('ADMIN_REFRESH_CHECK_INTERVAL', '60'))  # Seconds between due checks
+    
+    # Persistence (memory backend only; empty DATABASE_URL disables it)
+    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///data/telegram_bot.db')
+    DATABASE_FLUSH_INTERVAL = float(os.getenv('DATABASE_FLUSH_INTERVAL', '2'))  # Seconds between batched writes
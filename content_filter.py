@@ -0,0 +1,142 @@
+import re
+from collections import deque
+
+from telegram import Message, MessageEntity
+
+# Link policies of a chat
+LINKS_OFF = 0
+LINKS_INVITES = 1  # only Telegram invite links
+LINKS_ALL = 2
+LINK_MODES = {"off": LINKS_OFF, "invites": LINKS_INVITES, "all": LINKS_ALL}
+
+INVITE_LINK = re.compile(r"(?:t\.me|telegram\.(?:me|dog))/(?:\+|joinchat/)", re.IGNORECASE)
+
+# Arabic letters typed on Arabic keyboards in place of their Persian forms
+_LETTER_VARIANTS = str.maketrans({"ي": "ی", "ك": "ک", "ى": "ی"})
+
+
+def normalize(text: str) -> str:
+    """Case- and keyboard-insensitive form used for both patterns and message texts"""
+    return " ".join(text.casefold().translate(_LETTER_VARIANTS).split())
+
+
+class AhoCorasick:
+    """Finds every occurrence of many patterns in one pass over the text.
+
+    Patterns are added to the trie as they come; failure links are
+    recomputed once, on the next search after a change, so a batch of
+    additions costs one rebuild. Searching is linear in the text length
+    (plus the matches found), however many patterns there are.
+    """
+
+    def __init__(self, patterns=()):
+        self._goto = [{}]  # node -> {char: child node}
+        self._terminal = [None]  # node -> pattern ending there
+        self._fail = [0]
+        self._out = [()]  # node -> patterns ending there or at its failure chain
+        self._dirty = False
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str):
+        node = 0
+        for char in pattern:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = self._goto[node][char] = len(self._goto)
+                self._goto.append({})
+                self._terminal.append(None)
+            node = child
+        self._terminal[node] = pattern
+        self._dirty = True
+
+    def _build(self):
+        goto = self._goto
+        fail = [0] * len(goto)
+        out = [(pattern,) if pattern else () for pattern in self._terminal]
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0) if node else 0
+                out[child] += out[fail[child]]
+        self._fail = fail
+        self._out = out
+        self._dirty = False
+
+    def find(self, text: str):
+        """Yield (end index, pattern) for every occurrence"""
+        if self._dirty:
+            self._build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern in out[node]:
+                yield index, pattern
+
+
+class ContentFilter:
+    """A chat's blocked words and link policy.
+
+    Words match as whole words, ignoring case and Arabic/Persian letter
+    variants. The matcher is built on first use and extended in place when
+    words are added; removing words rebuilds it.
+    """
+
+    __slots__ = ("patterns", "link_mode", "_matcher")
+
+    def __init__(self):
+        self.patterns = frozenset()
+        self.link_mode = LINKS_OFF
+        self._matcher = None
+
+    def set_patterns(self, patterns):
+        """Replace the blocklist; a no-op when it is unchanged"""
+        patterns = frozenset(filter(None, map(normalize, patterns)))
+        if patterns == self.patterns:
+            return
+        if self._matcher is not None and patterns > self.patterns:
+            for pattern in patterns - self.patterns:
+                self._matcher.add(pattern)
+        else:
+            self._matcher = None
+        self.patterns = patterns
+
+    def is_empty(self) -> bool:
+        return not self.patterns and self.link_mode == LINKS_OFF
+
+    def check(self, message: Message):
+        """Why the message must be removed ("invite", "link" or "word"), or None"""
+        text = message.text or message.caption
+        if not text:
+            return None
+
+        if self.link_mode != LINKS_OFF:
+            link_types = [MessageEntity.URL, MessageEntity.TEXT_LINK]
+            entities = message.parse_entities(link_types) if message.text else message.parse_caption_entities(link_types)
+            links = [entity.url if entity.type == MessageEntity.TEXT_LINK else value for entity, value in entities.items()]
+            if INVITE_LINK.search(text) or any(INVITE_LINK.search(link) for link in links):
+                return "invite"
+            if self.link_mode == LINKS_ALL and links:
+                return "link"
+
+        if self.patterns and self._first_word(normalize(text)) is not None:
+            return "word"
+        return None
+
+    def _first_word(self, text: str):
+        if self._matcher is None:
+            self._matcher = AhoCorasick(self.patterns)
+        for end, pattern in self._matcher.find(text):
+            start = end - len(pattern) + 1
+            # Whole words only: "spam" must not hit "spammer"
+            if (start == 0 or not text[start - 1].isalnum()) and (end + 1 == len(text) or not text[end + 1].isalnum()):
+                return pattern
+        return None
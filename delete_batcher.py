@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter, TelegramError
+
+from metrics import DELETE_BATCH_SIZE, DELETE_FALLBACKS, DELETE_LATENCY
+from outbound_scheduler import OutboundScheduler, LANE_DELETE
+
+logger = logging.getLogger(__name__)
+
+# deleteMessages accepts at most this many ids per call
+MAX_DELETE_BATCH = 100
+
+
+class DeleteBatcher:
+    """Coalesces message deletions per chat into deleteMessages calls.
+
+    `delete` only queues the id, so callers never wait on Telegram. Ids a
+    chat queues within `window` seconds go out as one call in the
+    scheduler's delete lane; a chat has one batch in flight at a time, and
+    ids arriving meanwhile form its next batch. If the bulk call is refused,
+    each message of the batch is deleted on its own.
+    """
+
+    def __init__(self, scheduler: OutboundScheduler, bot, window: float = 0.1):
+        self.scheduler = scheduler
+        self.bot = bot
+        self.window = window
+        self._pending = {}  # chat_id -> list of (message_id, monotonic time queued)
+        self._flushers = {}  # chat_id -> task sending that chat's batches
+
+    def delete(self, chat_id: int, message_id: int):
+        """Queue a message for deletion"""
+        self._pending.setdefault(chat_id, []).append((message_id, time.monotonic()))
+        if chat_id not in self._flushers:
+            self._flushers[chat_id] = asyncio.create_task(self._flush_chat(chat_id))
+
+    def pending(self) -> int:
+        """Messages queued and not yet sent"""
+        return sum(len(queued) for queued in self._pending.values())
+
+    async def flush(self):
+        """Wait until every queued deletion has been sent"""
+        while self._flushers:
+            await asyncio.gather(*self._flushers.values(), return_exceptions=True)
+
+    async def _flush_chat(self, chat_id: int):
+        try:
+            while chat_id in self._pending:
+                if len(self._pending[chat_id]) < MAX_DELETE_BATCH:
+                    # Let a burst accumulate before spending a call on it
+                    await asyncio.sleep(self.window)
+                queued = self._pending.pop(chat_id)
+                batch, rest = queued[:MAX_DELETE_BATCH], queued[MAX_DELETE_BATCH:]
+                if rest:
+                    self._pending[chat_id] = rest
+                await self._send(chat_id, batch)
+        finally:
+            del self._flushers[chat_id]
+
+    async def _send(self, chat_id: int, batch: list):
+        message_ids = [message_id for message_id, _ in batch]
+        DELETE_BATCH_SIZE.observe(len(message_ids))
+        try:
+            if len(message_ids) == 1:
+                await self.scheduler.submit(chat_id, LANE_DELETE, self.bot.delete_message,
+                                            chat_id=chat_id, message_id=message_ids[0])
+            else:
+                await self.scheduler.submit(chat_id, LANE_DELETE, self.bot.delete_messages,
+                                            chat_id=chat_id, message_ids=message_ids)
+        except RetryAfter:
+            # The scheduler already retried and gave up; single deletes would hit the same limit
+            logger.error(f"Dropped deletion of {len(message_ids)} messages in chat {chat_id} after flood control")
+        except TelegramError as e:
+            if len(message_ids) == 1:
+                logger.warning(f"Could not delete message {message_ids[0]} in chat {chat_id}: {e}")
+            else:
+                logger.warning(f"deleteMessages failed in chat {chat_id} ({e}), deleting {len(message_ids)} messages one by one")
+                DELETE_FALLBACKS.inc()
+                await self._delete_each(chat_id, message_ids)
+        finally:
+            now = time.monotonic()
+            for _, queued_at in batch:
+                DELETE_LATENCY.observe(now - queued_at)
+
+    async def _delete_each(self, chat_id: int, message_ids: list):
+        for message_id in message_ids:
+            try:
+                await self.scheduler.submit(chat_id, LANE_DELETE, self.bot.delete_message,
+                                            chat_id=chat_id, message_id=message_id)
+            except TelegramError as e:
+                logger.warning(f"Could not delete message {message_id} in chat {chat_id}: {e}")
@@ -0,0 +1,224 @@
+"""
+Local stand-in for the Telegram Bot API, for load tests and benchmarks.
+
+Serves /bot<token>/<method> like api.telegram.org, with configurable
+latency and injected 429 (flood) answers. Updates are fed in with
+`push_update` and delivered through getUpdates (long polling); the calls the
+bot makes are recorded so a load test can tell when each message was
+deleted and reposted.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Fields sent as plain strings; everything else arrives JSON-encoded
+RAW_FIELDS = {"text", "caption", "parse_mode", "callback_query_id", "url", "secret_token"}
+
+# Methods that post into a chat and can be answered with 429
+FLOODABLE = re.compile(r"^(send|copy|forward)")
+
+# Marker the load generator puts in message texts, used to match reposts to originals
+MARKER = re.compile(r"load (-?\d+) (\d+)")
+
+ADMIN_RIGHTS = {
+    "can_be_edited": False, "is_anonymous": False, "can_manage_chat": True, "can_delete_messages": True,
+    "can_manage_video_chats": True, "can_restrict_members": True, "can_promote_members": False,
+    "can_change_info": True, "can_invite_users": True, "can_pin_messages": True,
+}
+
+
+class FakeBotAPI:
+    """In-process fake Bot API server"""
+
+    def __init__(self, token: str = "123456:FAKE", host: str = "127.0.0.1", port: int = 8081,
+                 latency: float = 0.0, jitter: float = 0.0, flood_probability: float = 0.0,
+                 retry_after: int = 1, admin_ids=(1,)):
+        self.token = token
+        self.bot_id = int(token.split(":")[0])
+        self.host = host
+        self.port = port
+        self.latency = latency  # seconds added to every call
+        self.jitter = jitter  # extra random latency, up to this many seconds
+        self.flood_probability = flood_probability  # chance that a send is answered with 429
+        self.retry_after = retry_after
+        self.admin_ids = admin_ids
+
+        self.calls = Counter()  # method -> count
+        self.floods = 0
+        self.deleted = {}  # (chat_id, message_id) -> monotonic time
+        self.reposted = {}  # (chat_id, original message_id) -> monotonic time
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(10_000_000)
+        self._new_update = asyncio.Event()
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_route("*", "/bot{token}/{method}", self._handle)
+
+    @property
+    def base_url(self) -> str:
+        """Value for TELEGRAM_BASE_URL"""
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Fake Bot API listening on {self.base_url}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def push_update(self, update: dict) -> dict:
+        """Queue an update (without update_id) for getUpdates and return it"""
+        update = {"update_id": next(self._update_ids), **update}
+        self._updates.append(update)
+        self._new_update.set()
+        return update
+
+    def bot_user(self) -> dict:
+        return {"id": self.bot_id, "is_bot": True, "first_name": "Load Test Bot", "username": "load_test_bot"}
+
+    def _message(self, chat_id, **content) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"Load {chat_id}"},
+            "from": self.bot_user(),
+            **content,
+        }
+
+    @staticmethod
+    async def _params(request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for name, value in (await request.post()).items():
+            if not isinstance(value, str):
+                continue  # uploaded file
+            if name in RAW_FIELDS:
+                params[name] = value
+            else:
+                try:
+                    params[name] = json.loads(value)
+                except ValueError:
+                    params[name] = value
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if request.match_info["token"] != self.token:
+            return web.json_response({"ok": False, "error_code": 401, "description": "Unauthorized"}, status=401)
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        if method != "getUpdates" and (self.latency or self.jitter):
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if FLOODABLE.match(method) and random.random() < self.flood_probability:
+            self.floods += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler is not None else self._api_default(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _api_getUpdates(self, params):
+        offset = params.get("offset", 0)
+        # Acknowledged updates are dropped, like the real API does
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), params.get("timeout", 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:params.get("limit", 100)]
+
+    async def _api_getMe(self, params):
+        return {**self.bot_user(), "can_join_groups": True, "can_read_all_group_messages": True,
+                "supports_inline_queries": False}
+
+    async def _api_getChatAdministrators(self, params):
+        admins = [{"status": "creator", "is_anonymous": False,
+                   "user": {"id": user_id, "is_bot": False, "first_name": f"Admin {user_id}"}}
+                  for user_id in self.admin_ids]
+        admins.append({"status": "administrator", "user": self.bot_user(), **ADMIN_RIGHTS})
+        return admins
+
+    async def _api_getChatMember(self, params):
+        user_id = params["user_id"]
+        if user_id in self.admin_ids:
+            return {"status": "creator", "is_anonymous": False,
+                    "user": {"id": user_id, "is_bot": False, "first_name": f"Admin {user_id}"}}
+        return {"status": "member", "user": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}}
+
+    async def _api_getChat(self, params):
+        return {"id": params["chat_id"], "type": "supergroup", "title": f"Load {params['chat_id']}"}
+
+    async def _api_deleteMessage(self, params):
+        self.deleted[(params["chat_id"], params["message_id"])] = time.monotonic()
+        return True
+
+    async def _api_deleteMessages(self, params):
+        now = time.monotonic()
+        for message_id in params["message_ids"]:
+            self.deleted[(params["chat_id"], message_id)] = now
+        return True
+
+    async def _api_sendMessage(self, params):
+        match = MARKER.search(params.get("text", ""))
+        if match:
+            self.reposted[(int(match.group(1)), int(match.group(2)))] = time.monotonic()
+        return self._message(params["chat_id"], text=params.get("text", ""))
+
+    async def _api_copyMessage(self, params):
+        self.reposted[(params["from_chat_id"], params["message_id"])] = time.monotonic()
+        return {"message_id": next(self._message_ids)}
+
+    async def _api_sendMediaGroup(self, params):
+        return [self._message(params["chat_id"]) for _ in params.get("media", [])]
+
+    def _api_default(self, method, params):
+        if method.startswith("send") and "chat_id" in params:
+            return self._message(params["chat_id"])
+        # setWebhook, deleteWebhook, setMyCommands, restrictChatMember, answerCallbackQuery, ...
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake Telegram Bot API server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token", default="123456:FAKE")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every call")
+    parser.add_argument("--flood", type=float, default=0.0, help="probability of a 429 on sends")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    async def serve():
+        api = FakeBotAPI(args.token, port=args.port, latency=args.latency, flood_probability=args.flood)
+        await api.start()
+        print(f"TELEGRAM_BASE_URL={api.base_url}\nTELEGRAM_BOT_TOKEN={api.token}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+
+from aiohttp import web
+from telegram.error import TelegramError
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Liveness and readiness checks for the orchestrator.
+
+    Liveness (/health) fails only when the bot is wedged: the event loop is
+    lagging by more than `max_loop_lag` seconds, or no Bot API call has
+    succeeded for `max_api_silence` seconds. A quiet bot makes no calls, so
+    a getMe probe is sent whenever nothing succeeded for `probe_interval`.
+    Readiness (/ready) reports whether the bot should get traffic right now.
+    """
+
+    def __init__(self, bot, requests, readiness, lag_interval: float = 1.0, max_loop_lag: float = 2.0,
+                 max_api_silence: float = 300.0, probe_interval: float = 60.0):
+        self.bot = bot
+        self.requests = requests  # InstrumentedRequest objects reporting last_success
+        self.readiness = readiness  # callable returning a list of reasons the bot isn't ready
+        self.lag_interval = lag_interval
+        self.max_loop_lag = max_loop_lag
+        self.max_api_silence = max_api_silence
+        self.probe_interval = probe_interval
+        self.loop_lag = 0.0  # seconds, from the latest measurement
+        self.started_at = time.monotonic()
+        self._tasks = []
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._measure_loop_lag()), asyncio.create_task(self._probe_api())]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _measure_loop_lag(self):
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(0.0, time.monotonic() - expected)
+            if self.loop_lag > self.max_loop_lag:
+                logger.warning(f"Event loop lagging by {self.loop_lag:.2f}s")
+
+    def api_silence(self) -> float:
+        """Seconds since the last successful Bot API call (or since start)"""
+        successes = [request.last_success for request in self.requests if request.last_success is not None]
+        return time.monotonic() - max(successes, default=self.started_at)
+
+    async def _probe_api(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            if self.api_silence() < self.probe_interval:
+                continue
+            try:
+                await self.bot.get_me()
+            except TelegramError as e:
+                logger.warning(f"Bot API probe failed: {e}")
+
+    def liveness_problems(self) -> list:
+        problems = []
+        if self.loop_lag > self.max_loop_lag:
+            problems.append(f"event loop lag {self.loop_lag:.2f}s")
+        silence = self.api_silence()
+        if silence > self.max_api_silence:
+            problems.append(f"no successful Bot API call for {silence:.0f}s")
+        return problems
+
+    async def health_handler(self, request: web.Request) -> web.Response:
+        problems = self.liveness_problems()
+        return web.json_response({
+            "status": "unhealthy" if problems else "healthy",
+            "problems": problems,
+            "loop_lag": round(self.loop_lag, 3),
+            "api_silence": round(self.api_silence(), 1),
+        }, status=503 if problems else 200)
+
+    async def ready_handler(self, request: web.Request) -> web.Response:
+        problems = self.readiness()
+        return web.json_response({
+            "status": "not_ready" if problems else "ready",
+            "problems": problems,
+        }, status=503 if problems else 200)
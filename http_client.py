@@ -0,0 +1,92 @@
+import socket
+import time
+
+import httpx
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+
+from metrics import API_LATENCY, API_RATE_LIMITED, API_REQUESTS
+
+
+def keepalive_socket_options(idle_seconds: int = 60) -> list:
+    """TCP keep-alive options so idle pooled connections aren't silently dropped by NAT/firewalls"""
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Linux-only knobs; other platforms keep the OS defaults
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle_seconds))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle_seconds // 4)))
+    if hasattr(socket, "TCP_KEEPCNT"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4))
+    return options
+
+
+class PooledRequest(HTTPXRequest):
+    """HTTPXRequest whose pool size and keep-alive settings are actually applied.
+
+    HTTPXRequest closes idle connections after httpx's default of 5 seconds,
+    so a burst arriving after a short lull pays for new TCP and TLS
+    handshakes. And once socket options are given it builds its own
+    transport, which silently ignores the configured pool limits; the
+    transport is therefore rebuilt here with the limits attached.
+    """
+
+    def __init__(self, connection_pool_size: int = 1, keepalive_expiry: float = 5.0, socket_options=None,
+                 **kwargs):
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+        limits = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=connection_pool_size,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client_kwargs["limits"] = limits
+        self._client_kwargs["transport"] = httpx.AsyncHTTPTransport(
+            limits=limits,
+            http1=self._client_kwargs["http1"],
+            http2=self._client_kwargs["http2"],
+            socket_options=socket_options
+        )
+        self._client = self._build_client()
+
+
+class InstrumentedRequest(PooledRequest):
+    """PooledRequest that counts Bot API calls by method and outcome and times them"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.last_success = None  # monotonic time of the last successful call, for health checks
+
+    async def post(self, url: str, *args, **kwargs):
+        method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            result = await super().post(url, *args, **kwargs)
+        except RetryAfter:
+            API_RATE_LIMITED.labels(method).inc()
+            API_REQUESTS.labels(method, "RetryAfter").inc()
+            raise
+        except Exception as e:
+            API_REQUESTS.labels(method, type(e).__name__).inc()
+            raise
+        else:
+            API_REQUESTS.labels(method, "ok").inc()
+            self.last_success = time.monotonic()
+            return result
+        finally:
+            API_LATENCY.labels(method).observe(time.perf_counter() - start)
+
+
+def build_request(pool_size: int, connect_timeout: float, read_timeout: float, write_timeout: float,
+                  pool_timeout: float, http_version: str = "1.1", keepalive_expiry: float = 5.0,
+                  tcp_keepalive: bool = True) -> InstrumentedRequest:
+    """Request object with its own connection pool"""
+    return InstrumentedRequest(
+        keepalive_expiry=keepalive_expiry,
+        connection_pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+        socket_options=keepalive_socket_options() if tcp_keepalive else None
+    )
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Offline load test for Admin Group Bot
+Replays a synthetic multi-chat message stream through AdminGroupBot against
+fake_bot_api.py and reports throughput, end-to-end latency and API calls
+per message. No Telegram account or live group is needed.
+
+Example:
+    python load_test.py --chats 20 --messages 2000 --rate 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import time
+
+import aiohttp
+
+from fake_bot_api import FakeBotAPI
+
+# Calls made once at startup or by polling itself, not per message
+SETUP_METHODS = {"getUpdates", "getMe", "setMyCommands", "deleteWebhook", "setWebhook", "getChatAdministrators"}
+
+STICKER = {"file_id": "CAACAgIAAxkBAAE", "file_unique_id": "AgADAQAD", "width": 512, "height": 512,
+           "is_animated": False, "is_video": False, "type": "regular"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test AdminGroupBot against a local fake Bot API")
+    parser.add_argument("--chats", type=int, default=20, help="number of groups")
+    parser.add_argument("--users", type=int, default=1000, help="distinct senders per group")
+    parser.add_argument("--messages", type=int, default=2000, help="messages to send in total")
+    parser.add_argument("--rate", type=float, default=200, help="messages per second offered")
+    parser.add_argument("--sticker-ratio", type=float, default=0.2, help="share of stickers (copied, not re-sent)")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake API latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random API latency, seconds")
+    parser.add_argument("--flood", type=float, default=0.0, help="probability of a 429 answer on sends")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--state", choices=("memory", "fakeredis"), default="memory")
+    parser.add_argument("--global-rate", type=float, default=1000, help="bot's global send rate per second")
+    parser.add_argument("--chat-rate", type=float, default=6000, help="bot's per-group send rate per minute")
+    parser.add_argument("--api-port", type=int, default=18081)
+    parser.add_argument("--bot-port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the backlog to drain")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args()
+
+
+def configure_environment(args, api: FakeBotAPI):
+    """Point the bot at the fake API; Config reads these when admin_group_bot is imported"""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": api.token,
+        "TELEGRAM_BASE_URL": api.base_url,
+        "BOT_MODE": args.mode,
+        "WEBHOOK_SECRET_TOKEN": "load-test-secret",
+        "WEB_SERVER_HOST": "127.0.0.1",
+        "WEB_SERVER_PORT": str(args.bot_port),
+        "DATABASE_URL": "",
+        "STATE_BACKEND": "memory",
+        "GLOBAL_RATE_PER_SECOND": str(args.global_rate),
+        "GLOBAL_BURST": str(args.global_rate),
+        "CHAT_RATE_PER_MINUTE": str(args.chat_rate),
+        "CHAT_BURST": str(args.chat_rate / 60),
+    })
+
+
+def make_message(chat_id: int, message_id: int, user_id: int, sticker: bool) -> dict:
+    message = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "supergroup", "title": f"Load {chat_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+    }
+    if sticker:
+        message["sticker"] = STICKER
+    else:
+        message["text"] = f"load {chat_id} {message_id}"
+    return {"message": message}
+
+
+def percentile(values: list, pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+async def run(args) -> dict:
+    api = FakeBotAPI(port=args.api_port, latency=args.latency, jitter=args.jitter, flood_probability=args.flood)
+    await api.start()
+    configure_environment(args, api)
+
+    from admin_group_bot import AdminGroupBot
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bot = AdminGroupBot()
+    if args.state == "fakeredis":
+        import fakeredis.aioredis
+        from state_backend import RedisStateBackend
+        bot.state = RedisStateBackend(bot.spam_detector, fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+    application = bot.application
+    sent = {}  # (chat_id, message_id) -> monotonic time the update was offered
+    chat_ids = [-1001000000000 - index for index in range(args.chats)]
+    webhook_url = f"http://127.0.0.1:{args.bot_port}{bot.web_server.webhook_path}"
+
+    async with application, aiohttp.ClientSession() as session:
+        await bot.post_init(application)
+        await application.start()
+        if args.mode == "polling":
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+
+        started = time.monotonic()
+        for index in range(args.messages):
+            # Pace the stream at the offered rate
+            delay = started + index / args.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            chat_id = random.choice(chat_ids)
+            message_id = index + 1
+            update = make_message(chat_id, message_id, random.randint(1000, 1000 + args.users),
+                                  random.random() < args.sticker_ratio)
+            sent[(chat_id, message_id)] = time.monotonic()
+            if args.mode == "polling":
+                api.push_update(update)
+            else:
+                update = {"update_id": index + 1, **update}
+                async with session.post(webhook_url, json=update,
+                                        headers={"X-Telegram-Bot-Api-Secret-Token": "load-test-secret"}) as response:
+                    response.raise_for_status()
+        offered = time.monotonic() - started
+
+        # Wait until every message was both deleted and reposted
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            if all(key in api.deleted and key in api.reposted for key in sent):
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.monotonic() - started
+
+        if args.mode == "polling":
+            await application.updater.stop()
+        await application.stop()
+        await bot.post_stop(application)
+    await bot.post_shutdown(application)
+    await api.stop()
+
+    latencies = sorted(max(api.deleted[key], api.reposted[key]) - at for key, at in sent.items()
+                       if key in api.deleted and key in api.reposted)
+    per_message_calls = sum(count for method, count in api.calls.items() if method not in SETUP_METHODS)
+    return {
+        "mode": args.mode,
+        "state": args.state,
+        "messages": args.messages,
+        "completed": len(latencies),
+        "offered_seconds": round(offered, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "api_calls_per_message": round(per_message_calls / args.messages, 2) if args.messages else 0.0,
+        "api_calls": dict(sorted(api.calls.items())),
+        "floods_injected": api.floods,
+    }
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run(args))
+
+    print("\n📊 Load test results")
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import time
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Latency buckets from 5 ms to 30 s: Bot API calls are ~50-300 ms, flood waits reach seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+QUEUE_WAIT = Histogram(
+    "bot_queue_wait_seconds", "Time a group message waits in its worker queue", buckets=LATENCY_BUCKETS
+)
+DELETE_LATENCY = Histogram(
+    "bot_delete_seconds", "Time from queuing a deletion until its batch was sent, including rate-limit waits",
+    buckets=LATENCY_BUCKETS
+)
+DELETE_BATCH_SIZE = Histogram(
+    "bot_delete_batch_size", "Messages removed per deleteMessages call", buckets=(1, 2, 5, 10, 25, 50, 100)
+)
+REPOST_LATENCY = Histogram(
+    "bot_repost_seconds", "Time to repost a message, including rate-limit waits", ["content_type"],
+    buckets=LATENCY_BUCKETS
+)
+API_REQUESTS = Counter(
+    "bot_api_requests_total", "Bot API calls by method and outcome (ok or error type)", ["method", "outcome"]
+)
+API_LATENCY = Histogram(
+    "bot_api_request_seconds", "Bot API call duration by method", ["method"], buckets=LATENCY_BUCKETS
+)
+API_RATE_LIMITED = Counter(
+    "bot_api_rate_limited_total", "Bot API calls answered with 429 Too Many Requests", ["method"]
+)
+OUTBOUND_RETRIES = Counter(
+    "bot_outbound_retries_total", "Outbound operations re-queued after a 429", ["lane"]
+)
+OUTBOUND_DROPS = Counter(
+    "bot_outbound_drops_total", "Outbound operations dropped after exhausting their 429 retries", ["lane"]
+)
+DELETE_FALLBACKS = Counter(
+    "bot_delete_fallbacks_total", "deleteMessages calls refused and redone one message at a time"
+)
+WORKER_ITEMS = Counter(
+    "bot_worker_items_total", "Queued items handled by the workers", ["outcome"]  # ok or error
+)
+MUTES = Counter(
+    "bot_mutes_total", "Users muted for flooding", ["kind"]  # restricted (native) or delete_only
+)
+CONTENT_FILTERED = Counter(
+    "bot_content_filtered_total", "Messages removed by the content filter", ["reason"]  # word, link or invite
+)
+CACHE_LOOKUPS = Counter(
+    "bot_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+
+
+async def timed(histogram, awaitable):
+    """Await and record the duration in `histogram` (also on failure)"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+class BotStateCollector:
+    """Exports queue depths, in-memory store sizes and rate-limit state, read at scrape time.
+
+    Per-chat depth and bucket levels are limited to the busiest chats so the
+    number of series stays bounded no matter how many groups the bot serves.
+    """
+
+    def __init__(self, bot, top_chats: int = 20):
+        self.bot = bot
+        self.top_chats = top_chats
+
+    def collect(self):
+        depths = self.bot.workers.depths
+        chat_depth = GaugeMetricFamily("bot_chat_queue_depth", "Queued messages of the busiest chats",
+                                       labels=["chat_id"])
+        for chat_id, depth in sorted(depths.items(), key=lambda entry: entry[1], reverse=True)[:self.top_chats]:
+            chat_depth.add_metric([str(chat_id)], depth)
+        yield chat_depth
+        yield GaugeMetricFamily("bot_queued_messages", "Messages queued for processing", value=sum(depths.values()))
+        shard_depth = GaugeMetricFamily("bot_shard_queue_depth", "Items waiting in each worker's queue", labels=["shard"])
+        for shard, queue in enumerate(self.bot.workers.queues):
+            shard_depth.add_metric([str(shard)], queue.qsize())
+        yield shard_depth
+
+        sizes = GaugeMetricFamily("bot_state_entries", "Entries held by in-memory stores", labels=["store"])
+        for store, size in self.bot.state_sizes().items():
+            sizes.add_metric([store], size)
+        yield sizes
+
+        scheduler = self.bot.scheduler.snapshot()
+        pending = GaugeMetricFamily("bot_outbound_pending", "Outbound operations waiting per lane", labels=["lane"])
+        for lane, count in scheduler["pending"].items():
+            pending.add_metric([lane], count)
+        yield pending
+        yield GaugeMetricFamily("bot_outbound_paused_chats", "Chats paused by flood control",
+                                value=scheduler["paused_chats"])
+        yield GaugeMetricFamily("bot_outbound_global_tokens", "Tokens left in the global rate-limit bucket",
+                                value=scheduler["global_tokens"])
+        chat_tokens = GaugeMetricFamily("bot_outbound_chat_tokens", "Tokens left in the buckets of the most drained chats",
+                                        labels=["chat_id"])
+        for chat_id, level in sorted(scheduler["chat_tokens"].items(), key=lambda entry: entry[1])[:self.top_chats]:
+            chat_tokens.add_metric([str(chat_id)], level)
+        yield chat_tokens
+
+
+def register_collector(bot):
+    REGISTRY.register(BotStateCollector(bot))
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Prometheus scrape endpoint"""
+    response = web.Response(body=generate_latest(REGISTRY))
+    response.headers["Content-Type"] = CONTENT_TYPE_LATEST
+    return response
@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import RetryAfter
+
+from metrics import OUTBOUND_DROPS, OUTBOUND_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, served in this order
+LANE_DELETE = 0  # deletions and other moderation actions
+LANE_REPOST = 1  # reposts of deleted messages
+LANE_NOTICE = 2  # bot notices (mute warnings, ...)
+LANES = (LANE_DELETE, LANE_REPOST, LANE_NOTICE)
+LANE_NAMES = {LANE_DELETE: "delete", LANE_REPOST: "repost", LANE_NOTICE: "notice"}
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        """Take one token (caller must have checked wait_time)"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def level(self, now: float) -> float:
+        """Tokens currently available"""
+        self._refill(now)
+        return self.tokens
+
+
+class _Operation:
+    __slots__ = ("chat_id", "lane", "func", "args", "kwargs", "future", "attempts")
+
+    def __init__(self, chat_id, lane, func, args, kwargs, future):
+        self.chat_id = chat_id
+        self.lane = lane
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class OutboundScheduler:
+    """Dispatches outbound Bot API calls within Telegram's rate limits.
+
+    Every call consumes a token from the global bucket. Calls that post a
+    message into a group (reposts, notices) also consume a token from that
+    chat's bucket; deletions do not count against the per-group limit.
+    Lanes are served strictly by priority, and chats within a lane
+    round-robin so one busy group cannot starve the others. A chat has at
+    most one operation in flight per lane, so its reposts land in order.
+
+    When Telegram answers with RetryAfter (429), only the affected chat is
+    paused for the requested time and the operation goes back to the head
+    of its lane, up to `max_retries` times before it is dropped.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float,
+                 chat_rate: float, chat_burst: float, max_retries: int = 5):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}  # chat_id -> TokenBucket
+        self.max_retries = max_retries
+        self.paused_until = {}  # chat_id -> monotonic time when flood control ends
+        self._lanes = {lane: OrderedDict() for lane in LANES}  # lane -> chat_id -> deque of operations
+        self._pending = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self._running = set()  # strong references to in-flight operations
+        self._in_flight = set()  # (lane, chat_id) pairs with an operation in flight
+
+    async def submit(self, chat_id: int, lane: int, func, /, *args, **kwargs):
+        """Queue `func(*args, **kwargs)` and wait for its result"""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        operation = _Operation(chat_id, lane, func, args, kwargs, future)
+        chat_ops = self._lanes[lane].get(chat_id)
+        if chat_ops is None:
+            chat_ops = self._lanes[lane][chat_id] = deque()
+        chat_ops.append(operation)
+        self._pending += 1
+        self._wakeup.set()
+        return await future
+
+    def _ensure_running(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Stop dispatching and fail whatever is still queued"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for chats in self._lanes.values():
+            for chat_ops in chats.values():
+                for operation in chat_ops:
+                    if not operation.future.done():
+                        operation.future.cancel()
+            chats.clear()
+        self._pending = 0
+        self._in_flight.clear()
+
+    async def _dispatch_loop(self):
+        while True:
+            operation, delay = self._next_ready()
+            if operation is None:
+                self._wakeup.clear()
+                if delay is None:
+                    await self._wakeup.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+            task = asyncio.create_task(self._execute(operation))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def _next_ready(self):
+        """Pop the next dispatchable operation, or return how long to wait"""
+        if not self._pending:
+            self._prune_idle_buckets()
+            return None, None
+
+        now = time.monotonic()
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        min_wait = None
+        for lane in LANES:
+            chats = self._lanes[lane]
+            for chat_id, chat_ops in list(chats.items()):
+                # Drop operations whose submitter has already given up
+                while chat_ops and chat_ops[0].future.done():
+                    chat_ops.popleft()
+                    self._pending -= 1
+                if not chat_ops:
+                    del chats[chat_id]
+                    continue
+                if (lane, chat_id) in self._in_flight:
+                    continue
+
+                paused_until = self.paused_until.get(chat_id)
+                if paused_until is not None:
+                    if paused_until > now:
+                        pause_wait = paused_until - now
+                        min_wait = pause_wait if min_wait is None else min(min_wait, pause_wait)
+                        continue
+                    del self.paused_until[chat_id]
+
+                bucket = None
+                if lane != LANE_DELETE:
+                    bucket = self._chat_bucket(chat_id, now)
+                    chat_wait = bucket.wait_time(now)
+                    if chat_wait > 0:
+                        min_wait = chat_wait if min_wait is None else min(min_wait, chat_wait)
+                        continue
+
+                operation = chat_ops.popleft()
+                if chat_ops:
+                    chats.move_to_end(chat_id)
+                else:
+                    del chats[chat_id]
+                self._pending -= 1
+                self._in_flight.add((lane, chat_id))
+                self.global_bucket.consume(now)
+                if bucket is not None:
+                    bucket.consume(now)
+                return operation, None
+
+        return None, min_wait
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _prune_idle_buckets(self):
+        # A full bucket or an elapsed pause carries no information, so forget it while idle
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self.chat_buckets.items() if bucket.level(now) >= bucket.capacity]:
+            del self.chat_buckets[chat_id]
+        for chat_id in [chat_id for chat_id, until in self.paused_until.items() if until <= now]:
+            del self.paused_until[chat_id]
+
+    async def _execute(self, operation: _Operation):
+        try:
+            await self._attempt(operation)
+        finally:
+            self._in_flight.discard((operation.lane, operation.chat_id))
+            self._wakeup.set()
+
+    async def _attempt(self, operation: _Operation):
+        if operation.future.done():
+            # Submitter went away (cancelled) while the operation was queued
+            return
+        try:
+            operation.attempts += 1
+            result = await operation.func(*operation.args, **operation.kwargs)
+        except RetryAfter as e:
+            if operation.attempts > self.max_retries:
+                OUTBOUND_DROPS.labels(LANE_NAMES[operation.lane]).inc()
+                logger.error(f"Dropping {LANE_NAMES[operation.lane]} operation for chat {operation.chat_id} "
+                             f"after {operation.attempts} rate-limited attempts")
+                if not operation.future.done():
+                    operation.future.set_exception(e)
+                return
+            self._requeue(operation, _seconds(e.retry_after))
+        except Exception as e:
+            if not operation.future.done():
+                operation.future.set_exception(e)
+        else:
+            if not operation.future.done():
+                operation.future.set_result(result)
+
+    def _requeue(self, operation: _Operation, retry_after: float):
+        """Pause the operation's chat and put the operation back at the head of its lane"""
+        OUTBOUND_RETRIES.labels(LANE_NAMES[operation.lane]).inc()
+        resume_at = time.monotonic() + retry_after
+        self.paused_until[operation.chat_id] = max(self.paused_until.get(operation.chat_id, 0), resume_at)
+
+        chats = self._lanes[operation.lane]
+        chat_ops = chats.get(operation.chat_id)
+        if chat_ops is None:
+            chat_ops = chats[operation.chat_id] = deque()
+        chat_ops.appendleft(operation)
+        self._pending += 1
+        logger.warning(f"Flood control in chat {operation.chat_id}: retrying "
+                       f"{LANE_NAMES[operation.lane]} operation in {retry_after:.1f}s "
+                       f"(attempt {operation.attempts}/{self.max_retries})")
+        self._wakeup.set()
+
+    def snapshot(self) -> dict:
+        """Current bucket levels, paused chats and queued operations per lane"""
+        now = time.monotonic()
+        return {
+            "global_tokens": round(self.global_bucket.level(now), 2),
+            "chat_tokens": {chat_id: round(bucket.level(now), 2) for chat_id, bucket in self.chat_buckets.items()},
+            "pending": {
+                LANE_NAMES[lane]: sum(len(chat_ops) for chat_ops in chats.values())
+                for lane, chats in self._lanes.items()
+            },
+            "paused_chats": len(self.paused_until),
+        }
+
+
+def _seconds(retry_after) -> float:
+    # Newer python-telegram-bot versions report a timedelta instead of an int
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_admins (
+    chat_id INTEGER PRIMARY KEY,
+    admin_ids TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_settings (
+    chat_id INTEGER PRIMARY KEY,
+    spam_mode INTEGER NOT NULL DEFAULT 0,
+    spam_threshold INTEGER,
+    spam_window INTEGER,
+    merge_window INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chat_filters (
+    chat_id INTEGER PRIMARY KEY,
+    patterns TEXT NOT NULL,
+    link_mode INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS mutes (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    mute_until REAL NOT NULL,
+    PRIMARY KEY (chat_id, user_id)
+);
+"""
+
+
+def sqlite_path(database_url: str):
+    """Extract the file path from a sqlite:/// URL (None if not a SQLite URL)"""
+    prefix = "sqlite:///"
+    if database_url.startswith(prefix):
+        return database_url[len(prefix):] or None
+    return None
+
+
+class SQLiteStore:
+    """Durable copy of admin lists, mutes, chat settings and content filters.
+
+    Writes only update an in-memory buffer, where a newer write for the same
+    key replaces the older one. The buffer is flushed in a single transaction
+    every `flush_interval` seconds on a worker thread, so the event loop never
+    waits for the disk.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._connection = None
+        self._db_lock = asyncio.Lock()  # one thread at a time on the connection
+        self._flusher = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._forgotten = set()  # chat ids whose rows are deleted before the upserts below
+        self._admins = {}  # chat_id -> frozenset
+        self._settings = {}  # chat_id -> (spam_mode, spam_limits, merge_window)
+        self._filters = {}  # chat_id -> (patterns, link_mode)
+        self._mutes = {}  # (chat_id, user_id) -> mute_until, or None to delete
+
+    async def open(self):
+        """Open the database, create tables and start the flush loop"""
+        async with self._db_lock:
+            await asyncio.to_thread(self._connect)
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        logger.info(f"SQLite state store opened at {self.path}")
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        # Databases created before burst merging lack its column
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(chat_settings)")}
+        if "merge_window" not in columns:
+            self._connection.execute("ALTER TABLE chat_settings ADD COLUMN merge_window INTEGER NOT NULL DEFAULT 0")
+        self._connection.commit()
+
+    async def load(self) -> dict:
+        """Everything stored, as chat_id -> {admins, spam_mode, spam_limits, merge_window, blocklist, link_mode, mutes}"""
+        async with self._db_lock:
+            return await asyncio.to_thread(self._read_all, time.time())
+
+    def _read_all(self, now: float) -> dict:
+        db = self._connection
+        # Expired mutes are never needed again
+        db.execute("DELETE FROM mutes WHERE mute_until <= ?", (now,))
+        db.commit()
+
+        chats = {}
+
+        def chat(chat_id):
+            return chats.setdefault(chat_id, {"admins": frozenset(), "spam_mode": False,
+                                              "spam_limits": None, "merge_window": 0, "blocklist": frozenset(),
+                                              "link_mode": 0, "mutes": {}})
+
+        for chat_id, admin_ids in db.execute("SELECT chat_id, admin_ids FROM chat_admins"):
+            chat(chat_id)["admins"] = frozenset(json.loads(admin_ids))
+        for chat_id, spam_mode, threshold, window, merge_window in db.execute(
+                "SELECT chat_id, spam_mode, spam_threshold, spam_window, merge_window FROM chat_settings"):
+            data = chat(chat_id)
+            data["spam_mode"] = bool(spam_mode)
+            data["spam_limits"] = (threshold, window) if threshold is not None else None
+            data["merge_window"] = merge_window
+        for chat_id, patterns, link_mode in db.execute("SELECT chat_id, patterns, link_mode FROM chat_filters"):
+            data = chat(chat_id)
+            data["blocklist"] = frozenset(json.loads(patterns))
+            data["link_mode"] = link_mode
+        for chat_id, user_id, mute_until in db.execute("SELECT chat_id, user_id, mute_until FROM mutes"):
+            chat(chat_id)["mutes"][user_id] = mute_until
+        return chats
+
+    def save_admins(self, chat_id: int, admins: frozenset):
+        self._admins[chat_id] = admins
+
+    def save_settings(self, chat_id: int, spam_mode: bool, spam_limits, merge_window: int = 0):
+        self._settings[chat_id] = (spam_mode, spam_limits, merge_window)
+
+    def save_filter(self, chat_id: int, patterns: frozenset, link_mode: int):
+        self._filters[chat_id] = (patterns, link_mode)
+
+    def save_mute(self, chat_id: int, user_id: int, mute_until: float):
+        self._mutes[(chat_id, user_id)] = mute_until
+
+    def delete_mute(self, chat_id: int, user_id: int):
+        self._mutes[(chat_id, user_id)] = None
+
+    def forget_chat(self, chat_id: int):
+        self._forgotten.add(chat_id)
+        self._admins.pop(chat_id, None)
+        self._settings.pop(chat_id, None)
+        self._filters.pop(chat_id, None)
+        for key in [key for key in self._mutes if key[0] == chat_id]:
+            del self._mutes[key]
+
+    async def flush(self):
+        """Write buffered changes in one transaction"""
+        if not (self._forgotten or self._admins or self._settings or self._filters or self._mutes):
+            return
+        batch = (self._forgotten, self._admins, self._settings, self._filters, self._mutes)
+        self._reset_buffer()
+        try:
+            async with self._db_lock:
+                await asyncio.to_thread(self._write_batch, *batch)
+        except sqlite3.Error:
+            # Keep the failed batch for the next attempt, unless newer writes replaced it
+            forgotten, admins, settings, filters, mutes = batch
+            self._forgotten |= forgotten
+            for buffer, failed in ((self._admins, admins), (self._settings, settings), (self._filters, filters),
+                                   (self._mutes, mutes)):
+                for key, value in failed.items():
+                    buffer.setdefault(key, value)
+            raise
+
+    def _write_batch(self, forgotten, admins, settings, filters, mutes):
+        db = self._connection
+        with db:
+            for chat_id in forgotten:
+                db.execute("DELETE FROM chat_admins WHERE chat_id = ?", (chat_id,))
+                db.execute("DELETE FROM chat_settings WHERE chat_id = ?", (chat_id,))
+                db.execute("DELETE FROM chat_filters WHERE chat_id = ?", (chat_id,))
+                db.execute("DELETE FROM mutes WHERE chat_id = ?", (chat_id,))
+            db.executemany(
+                "INSERT OR REPLACE INTO chat_admins (chat_id, admin_ids) VALUES (?, ?)",
+                [(chat_id, json.dumps(sorted(ids))) for chat_id, ids in admins.items()]
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO chat_settings (chat_id, spam_mode, spam_threshold, spam_window, merge_window) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(chat_id, int(spam_mode), *(limits or (None, None)), merge_window)
+                 for chat_id, (spam_mode, limits, merge_window) in settings.items()]
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO chat_filters (chat_id, patterns, link_mode) VALUES (?, ?, ?)",
+                [(chat_id, json.dumps(sorted(patterns), ensure_ascii=False), link_mode)
+                 for chat_id, (patterns, link_mode) in filters.items()]
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO mutes (chat_id, user_id, mute_until) VALUES (?, ?, ?)",
+                [(chat_id, user_id, until) for (chat_id, user_id), until in mutes.items() if until is not None]
+            )
+            db.executemany(
+                "DELETE FROM mutes WHERE chat_id = ? AND user_id = ?",
+                [key for key, until in mutes.items() if until is None]
+            )
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing state to SQLite: {e}")
+
+    async def close(self):
+        """Flush pending writes and close the database"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._connection is not None:
+            await self.flush()
+            async with self._db_lock:
+                await asyncio.to_thread(self._connection.close)
+            self._connection = None
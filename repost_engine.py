@@ -0,0 +1,278 @@
+import html
+import logging
+
+from telegram import (Bot, Message, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaAudio, InputMediaDocument,
+                      InputMediaPhoto, InputMediaVideo)
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from outbound_scheduler import OutboundScheduler, LANE_REPOST
+
+logger = logging.getLogger(__name__)
+
+# Callback data of the inline button that carries the author's name
+NAME_BUTTON_DATA = "repost_author"
+
+# Longest text a single message may carry
+MAX_TEXT_LENGTH = 4096
+
+# attribute -> (display name, fallback send method, supports caption)
+# Order matters: a venue message also carries a location
+CONTENT_TYPES = (
+    ("sticker", "استیکر", "send_sticker", False),
+    ("photo", "عکس", "send_photo", True),
+    ("video", "ویدیو", "send_video", True),
+    ("voice", "صدا", "send_voice", True),
+    ("video_note", "ویدیو نوت", "send_video_note", False),
+    ("document", "فایل", "send_document", True),
+    ("audio", "آهنگ", "send_audio", True),
+    ("animation", "گیف", "send_animation", True),
+    ("contact", "مخاطب", "send_contact", False),
+    ("venue", "مکان", "send_venue", False),
+    ("location", "موقعیت", "send_location", False),
+    ("poll", "نظرسنجی", "send_poll", False),
+    ("dice", "تاس", "send_dice", False),
+)
+
+# Content types that can be part of an album -> InputMedia class for sendMediaGroup
+ALBUM_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio,
+}
+
+
+def content_type(message: Message):
+    """Return (attribute, display name, send method, supports caption) or None"""
+    for entry in CONTENT_TYPES:
+        if getattr(message, entry[0]):
+            return entry
+    return None
+
+
+class RepostEngine:
+    """Reposts a member's message under their name with a single API call.
+
+    Text is re-sent with the name prepended. Everything else is copied with
+    copyMessage: media that supports captions gets the name added to its
+    caption, other types carry the name on an inline button. If the copy is
+    refused (e.g. protected content) the per-type send path is used instead.
+    Reposts are sent even if the message they reply to no longer exists.
+    Later edits of the original are applied to the repost in place.
+    """
+
+    def __init__(self, scheduler: OutboundScheduler):
+        self.scheduler = scheduler
+
+    async def repost(self, bot: Bot, message: Message, user_name: str, reply_to_message_id: int = None):
+        """Repost `message` as a reply to `reply_to_message_id` and return the new message id (None if not repostable)"""
+        chat_id = message.chat_id
+        name_html = f"<b>{html.escape(user_name)}:</b>"
+
+        if message.text:
+            sent = await self.scheduler.submit(
+                chat_id, LANE_REPOST, bot.send_message,
+                chat_id=chat_id,
+                text=f"{name_html}\n{message.text_html}",
+                parse_mode=ParseMode.HTML,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True
+            )
+            return sent.message_id
+
+        entry = content_type(message)
+        if entry is None:
+            return None
+        _, _, send_method, supports_caption = entry
+
+        caption = f"{name_html}\n{message.caption_html}" if message.caption else name_html
+        if supports_caption:
+            extra = {"caption": caption, "parse_mode": ParseMode.HTML}
+        else:
+            extra = {"reply_markup": self._name_button(user_name)}
+
+        try:
+            copied = await self.scheduler.submit(
+                chat_id, LANE_REPOST, bot.copy_message,
+                chat_id=chat_id,
+                from_chat_id=chat_id,
+                message_id=message.message_id,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True,
+                **extra
+            )
+            return copied.message_id
+        except RetryAfter:
+            # Flood control already retried this; another call would only make it worse
+            raise
+        except TelegramError as e:
+            logger.warning(f"copyMessage failed in chat {chat_id} ({e}), falling back to {send_method}")
+            return await self._send_per_type(bot, message, name_html, caption, reply_to_message_id)
+
+    async def repost_burst(self, bot: Bot, messages: list, user_name: str, reply_to_message_id: int = None) -> list:
+        """Repost consecutive texts of one user as one message and return the repost id of each original.
+
+        The texts are joined under a single name line and only split into
+        several messages where the result would exceed MAX_TEXT_LENGTH
+        (measured on the HTML, which is never shorter than what Telegram counts).
+        """
+        chat_id = messages[0].chat_id
+        name_html = f"<b>{html.escape(user_name)}:</b>"
+
+        chunks = []  # (text, number of originals it holds)
+        text, count = name_html, 0
+        for message in messages:
+            piece = message.text_html
+            if count and len(text) + 1 + len(piece) > MAX_TEXT_LENGTH:
+                chunks.append((text, count))
+                text, count = name_html, 0
+            text += f"\n{piece}"
+            count += 1
+        chunks.append((text, count))
+
+        repost_ids = []
+        for text, count in chunks:
+            sent = await self.scheduler.submit(
+                chat_id, LANE_REPOST, bot.send_message,
+                chat_id=chat_id,
+                text=text,
+                parse_mode=ParseMode.HTML,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True
+            )
+            # Only the first part answers the replied-to message
+            reply_to_message_id = None
+            repost_ids.extend([sent.message_id] * count)
+        return repost_ids
+
+    async def repost_album(self, bot: Bot, messages: list, user_name: str, reply_to_message_id: int = None) -> tuple:
+        """Repost an album and return (new message ids in order, whether it went out as one media group).
+
+        In a media group the name goes in the first item's caption only, like
+        Telegram shows an album's caption. If the group is refused, each item
+        is reposted alone with the name; items that fail then too get None
+        instead of an id.
+        """
+        chat_id = messages[0].chat_id
+        name_html = f"<b>{html.escape(user_name)}:</b>"
+
+        media = []
+        for message in messages:
+            attribute = content_type(message)[0]
+            caption = message.caption_html if message.caption else None
+            if not media:
+                caption = f"{name_html}\n{caption}" if caption else name_html
+            file = message.photo[-1] if message.photo else getattr(message, attribute)
+            media.append(ALBUM_MEDIA[attribute](media=file, caption=caption, parse_mode=ParseMode.HTML))
+
+        try:
+            sent = await self.scheduler.submit(
+                chat_id, LANE_REPOST, bot.send_media_group,
+                chat_id=chat_id,
+                media=media,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True
+            )
+            return [message.message_id for message in sent], True
+        except RetryAfter:
+            raise
+        except TelegramError as e:
+            logger.warning(f"sendMediaGroup failed in chat {chat_id} ({e}), reposting the album item by item")
+            repost_ids = []
+            for message in messages:
+                try:
+                    repost_ids.append(await self.repost(bot, message, user_name, reply_to_message_id))
+                except TelegramError as e:
+                    logger.warning(f"Could not repost album item {message.message_id} in chat {chat_id}: {e}")
+                    repost_ids.append(None)
+            return repost_ids, False
+
+    async def edit(self, bot: Bot, message: Message, user_name: str, repost_id: int, named: bool = True) -> bool:
+        """Apply an edit of `message` to its repost; False if that content type has nothing editable.
+
+        `named` is False for reposts without the author's name (album items after the first).
+        """
+        chat_id = message.chat_id
+        name_html = f"<b>{html.escape(user_name)}:</b>"
+
+        if message.text:
+            edit_method = bot.edit_message_text
+            extra = {"text": f"{name_html}\n{message.text_html}"}
+        else:
+            entry = content_type(message)
+            if entry is None or not entry[3]:
+                # Stickers, polls, locations, ... carry the name on a button; their content can't change
+                return False
+            edit_method = bot.edit_message_caption
+            if named:
+                extra = {"caption": f"{name_html}\n{message.caption_html}" if message.caption else name_html}
+            else:
+                extra = {"caption": message.caption_html if message.caption else None}
+
+        try:
+            await self.scheduler.submit(
+                chat_id, LANE_REPOST, edit_method,
+                chat_id=chat_id,
+                message_id=repost_id,
+                parse_mode=ParseMode.HTML,
+                **extra
+            )
+        except BadRequest as e:
+            # Edits that only touched formatting we don't carry over leave the repost unchanged
+            if "not modified" not in e.message:
+                raise
+        return True
+
+    @staticmethod
+    def _name_button(user_name: str) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([[InlineKeyboardButton(f"👤 {user_name}", callback_data=NAME_BUTTON_DATA)]])
+
+    async def _send_per_type(self, bot: Bot, message: Message, name_html: str, caption: str,
+                             reply_to_message_id):
+        """Re-send the media with the type-specific send method"""
+        chat_id = message.chat_id
+        attribute, _, send_method, supports_caption = content_type(message)
+        submit = self.scheduler.submit
+
+        if message.poll:
+            poll = message.poll
+            sent = await submit(
+                chat_id, LANE_REPOST, bot.send_poll,
+                chat_id=chat_id,
+                question=poll.question,
+                options=[option.text for option in poll.options],
+                is_anonymous=poll.is_anonymous,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True
+            )
+            return sent.message_id
+
+        if message.dice:
+            media = {"emoji": message.dice.emoji}
+        elif message.photo:
+            media = {"photo": message.photo[-1]}
+        else:
+            media = {attribute: getattr(message, attribute)}
+
+        if supports_caption:
+            media.update(caption=caption, parse_mode=ParseMode.HTML)
+        elif attribute in ("sticker", "video_note"):
+            # These can't have captions, so the name goes in its own message first
+            await submit(
+                chat_id, LANE_REPOST, bot.send_message,
+                chat_id=chat_id,
+                text=name_html,
+                parse_mode=ParseMode.HTML,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True
+            )
+
+        sent = await submit(
+            chat_id, LANE_REPOST, getattr(bot, send_method),
+            chat_id=chat_id,
+            reply_to_message_id=reply_to_message_id,
+            allow_sending_without_reply=True,
+            **media
+        )
+        return sent.message_id
@@ -67,7 +67,7 @@ chmod 644 LICENSE
 chmod 644 Dockerfile
 
 # Database file - read/write for owner only
-chmod 600 telegram_bot.db 2>/dev/null || echo "ℹ️ Database file not found (will be created later)"
+chmod 600 data/telegram_bot.db 2>/dev/null || echo "ℹ️ Database file not found (will be created later)"
 
 # Log files - read/write for owner only
 chmod 600 bot.log 2>/dev/null || echo "ℹ️ Log file not found (will be created later)"
@@ -0,0 +1,83 @@
+from array import array
+
+from chat_state import ChatState
+
+
+class SpamWindow:
+    """Ring buffer of a user's last `size` message times"""
+
+    __slots__ = ("times", "head", "count")
+
+    def __init__(self, size: int):
+        self.times = array("d", bytes(8 * size))
+        self.head = 0  # next slot to write, which also holds the oldest time once full
+        self.count = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.times)
+
+    def record(self, now: float):
+        """Store a message time and return the oldest time still in the buffer if it is full"""
+        self.times[self.head] = now
+        self.head = (self.head + 1) % len(self.times)
+        if self.count < len(self.times):
+            self.count += 1
+            if self.count < len(self.times):
+                return None
+        return self.times[self.head]
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def newest(self) -> float:
+        return self.times[self.head - 1] if self.count else 0.0
+
+
+class SpamDetector:
+    """Sliding-window flood detector with O(1) work per message.
+
+    Each user of a chat keeps a ring buffer of their last `threshold + 1`
+    message times. A user is flooding when the oldest entry of a full buffer
+    is still inside the window, i.e. more than `threshold` messages arrived
+    within `window_seconds`.
+    """
+
+    def __init__(self, threshold: int, window_seconds: float, max_tracked_users: int = 5000):
+        self.default_limits = (threshold, window_seconds)
+        self.max_tracked_users = max_tracked_users  # per chat
+
+    def limits(self, state: ChatState) -> tuple:
+        """(threshold, window_seconds) in effect for a chat"""
+        return state.spam_limits or self.default_limits
+
+    def hit(self, state: ChatState, user_id: int, now: float) -> bool:
+        """Record a message and return True if the user exceeded the limit"""
+        threshold, window_seconds = self.limits(state)
+        windows = state.spam_windows
+        window = windows.get(user_id)
+        if window is None or window.size != threshold + 1:
+            if window is None and len(windows) >= self.max_tracked_users:
+                # Drop the longest-tracked user; the sweeper normally keeps this from happening
+                del windows[next(iter(windows))]
+            window = windows[user_id] = SpamWindow(threshold + 1)
+
+        oldest = window.record(now)
+        if oldest is not None and now - oldest < window_seconds:
+            window.clear()
+            return True
+        return False
+
+    def reset(self, state: ChatState, user_id: int):
+        """Forget a user's message history"""
+        state.spam_windows.pop(user_id, None)
+
+    def sweep(self, state: ChatState, now: float) -> int:
+        """Drop histories whose newest message is already outside the window"""
+        window_seconds = self.limits(state)[1]
+        stale = [user_id for user_id, window in state.spam_windows.items()
+                 if now - window.newest() >= window_seconds]
+        for user_id in stale:
+            del state.spam_windows[user_id]
+        return len(stale)
@@ -0,0 +1,251 @@
+import logging
+
+from chat_state import ChatRegistry, ChatState
+from persistence import SQLiteStore, sqlite_path
+from spam_detector import SpamDetector
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # Redis support is optional
+    aioredis = None
+    RedisError = Exception
+
+logger = logging.getLogger(__name__)
+
+# KEYS: mute key, spam key; ARGV: message time, threshold, window in ms.
+# A muted user's messages are not counted, so the first message after the
+# mute ends starts from an empty window.
+RECORD_MESSAGE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {1, false}
+end
+redis.call('LPUSH', KEYS[2], ARGV[1])
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[2]))
+local oldest = redis.call('LINDEX', KEYS[2], tonumber(ARGV[2]))
+redis.call('PEXPIRE', KEYS[2], tonumber(ARGV[3]))
+return {0, oldest}
+"""
+
+
+class MemoryStateBackend:
+    """Default backend: state lives in this process's ChatState objects.
+
+    With a SQLiteStore, admin sets, mutes and settings are also written to
+    disk and loaded back by `warm_start`, so a restart keeps them; spam
+    windows are short-lived and stay in memory only.
+    """
+
+    def __init__(self, spam_detector: SpamDetector, store: SQLiteStore = None):
+        self.spam_detector = spam_detector
+        self.store = store
+
+    async def warm_start(self, chats: ChatRegistry):
+        """Fill the registry with everything persisted by a previous run"""
+        if self.store is None:
+            return
+        await self.store.open()
+        snapshot = await self.store.load()
+        for chat_id, data in snapshot.items():
+            state = chats.get_or_create(chat_id)
+            state.admins = data["admins"]
+            state.spam_mode = data["spam_mode"]
+            state.spam_limits = data["spam_limits"]
+            state.merge_window = data["merge_window"]
+            state.content_filter.set_patterns(data["blocklist"])
+            state.content_filter.link_mode = data["link_mode"]
+            state.mutes.update(data["mutes"])
+        logger.info(f"Restored state of {len(snapshot)} chats from {self.store.path}")
+
+    async def load_chat(self, state: ChatState):
+        """Refresh a chat's admins and settings from the backend"""
+
+    async def save_admins(self, state: ChatState):
+        """Persist a chat's admin set"""
+        if self.store is not None:
+            self.store.save_admins(state.chat_id, state.admins)
+
+    async def save_settings(self, state: ChatState):
+        """Persist a chat's spam mode, spam limits and burst merge window"""
+        if self.store is not None:
+            self.store.save_settings(state.chat_id, state.spam_mode, state.spam_limits, state.merge_window)
+
+    async def save_filter(self, state: ChatState):
+        """Persist a chat's blocked words and link policy"""
+        if self.store is not None:
+            self.store.save_filter(state.chat_id, state.content_filter.patterns, state.content_filter.link_mode)
+
+    async def record_message(self, state: ChatState, user_id: int, now: float) -> tuple:
+        """Count a message and return (muted, spamming)"""
+        if state.is_muted(user_id, now):
+            return True, False
+        return False, self.spam_detector.hit(state, user_id, now)
+
+    async def mute(self, state: ChatState, user_id: int, mute_until: float, max_mutes: int):
+        state.mute(user_id, mute_until, max_mutes)
+        if self.store is not None:
+            self.store.save_mute(state.chat_id, user_id, mute_until)
+
+    async def unmute(self, state: ChatState, user_id: int) -> bool:
+        """Lift a mute and clear the user's history; False if they weren't muted"""
+        self.spam_detector.reset(state, user_id)
+        if self.store is not None:
+            self.store.delete_mute(state.chat_id, user_id)
+        return state.mutes.pop(user_id, None) is not None
+
+    async def forget_chat(self, chat_id: int):
+        """Drop everything stored for a chat the bot has left"""
+        if self.store is not None:
+            self.store.forget_chat(chat_id)
+
+    async def close(self):
+        if self.store is not None:
+            await self.store.close()
+
+
+class RedisStateBackend(MemoryStateBackend):
+    """Shares admin sets, mutes, spam windows and settings between replicas.
+
+    Admins and settings are mirrored into the local ChatState (and re-read
+    every sync interval), so the per-message path only touches mutes and the
+    spam window: a single script call.
+
+    Keys:
+        {prefix}:{chat}:admins          set of user ids
+        {prefix}:{chat}:settings        hash: spam_mode, spam_threshold, spam_window, merge_window
+        {prefix}:{chat}:blocklist       set of blocked words
+        {prefix}:{chat}:link_mode       link policy (0 off, 1 invites, 2 all)
+        {prefix}:{chat}:mute:{user}     mute end timestamp, expires with the mute
+        {prefix}:{chat}:spam:{user}     list of the last threshold+1 message times
+    """
+
+    def __init__(self, spam_detector: SpamDetector, client, prefix: str = "admin_bot"):
+        super().__init__(spam_detector)
+        self.redis = client
+        self.prefix = prefix
+        self._record_message = client.register_script(RECORD_MESSAGE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, spam_detector: SpamDetector, url: str, prefix: str = "admin_bot"):
+        if aioredis is None:
+            raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        return cls(spam_detector, aioredis.Redis.from_url(url, decode_responses=True), prefix)
+
+    def _key(self, chat_id: int, *parts) -> str:
+        return ":".join((self.prefix, str(chat_id), *map(str, parts)))
+
+    async def load_chat(self, state: ChatState):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.smembers(self._key(state.chat_id, "admins"))
+                pipe.hgetall(self._key(state.chat_id, "settings"))
+                pipe.smembers(self._key(state.chat_id, "blocklist"))
+                pipe.get(self._key(state.chat_id, "link_mode"))
+                admins, settings, blocklist, link_mode = await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not load state of chat {state.chat_id} from Redis: {e}")
+            return
+
+        state.admins = frozenset(int(user_id) for user_id in admins)
+        state.spam_mode = settings.get("spam_mode") == "1"
+        state.merge_window = int(settings.get("merge_window", 0))
+        # Unchanged blocklists keep their compiled matcher
+        state.content_filter.set_patterns(blocklist)
+        state.content_filter.link_mode = int(link_mode or 0)
+        if "spam_threshold" in settings:
+            state.spam_limits = (int(settings["spam_threshold"]), int(settings["spam_window"]))
+        else:
+            state.spam_limits = None
+
+    async def save_admins(self, state: ChatState):
+        key = self._key(state.chat_id, "admins")
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if state.admins:
+                    pipe.sadd(key, *state.admins)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not save admins of chat {state.chat_id} to Redis: {e}")
+
+    async def save_settings(self, state: ChatState):
+        key = self._key(state.chat_id, "settings")
+        settings = {"spam_mode": int(state.spam_mode), "merge_window": state.merge_window}
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if state.spam_limits is None:
+                    pipe.hdel(key, "spam_threshold", "spam_window")
+                else:
+                    settings["spam_threshold"], settings["spam_window"] = state.spam_limits
+                pipe.hset(key, mapping=settings)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not save settings of chat {state.chat_id} to Redis: {e}")
+
+    async def save_filter(self, state: ChatState):
+        key = self._key(state.chat_id, "blocklist")
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if state.content_filter.patterns:
+                    pipe.sadd(key, *state.content_filter.patterns)
+                pipe.set(self._key(state.chat_id, "link_mode"), state.content_filter.link_mode)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not save content filter of chat {state.chat_id} to Redis: {e}")
+
+    async def record_message(self, state: ChatState, user_id: int, now: float) -> tuple:
+        threshold, window_seconds = self.spam_detector.limits(state)
+        keys = [self._key(state.chat_id, "mute", user_id), self._key(state.chat_id, "spam", user_id)]
+        try:
+            muted, oldest = await self._record_message(keys=keys, args=[now, threshold, int(window_seconds * 1000)])
+        except RedisError as e:
+            # Fail open: reposting a message beats losing it
+            logger.error(f"Redis unavailable while checking user {user_id} in chat {state.chat_id}: {e}")
+            return False, False
+
+        if muted:
+            return True, False
+        return False, oldest is not None and now - float(oldest) < window_seconds
+
+    async def mute(self, state: ChatState, user_id: int, mute_until: float, max_mutes: int):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(self._key(state.chat_id, "mute", user_id), mute_until, exat=int(mute_until) + 1)
+                pipe.delete(self._key(state.chat_id, "spam", user_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not store mute of user {user_id} in chat {state.chat_id}: {e}")
+
+    async def unmute(self, state: ChatState, user_id: int) -> bool:
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(self._key(state.chat_id, "mute", user_id))
+                pipe.delete(self._key(state.chat_id, "spam", user_id))
+                removed, _ = await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not remove mute of user {user_id} in chat {state.chat_id}: {e}")
+            return False
+        return removed > 0
+
+    async def forget_chat(self, chat_id: int):
+        try:
+            await self.redis.delete(self._key(chat_id, "admins"), self._key(chat_id, "settings"),
+                                    self._key(chat_id, "blocklist"), self._key(chat_id, "link_mode"))
+        except RedisError as e:
+            logger.error(f"Could not forget chat {chat_id} in Redis: {e}")
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_state_backend(kind: str, spam_detector: SpamDetector, redis_url: str = "", prefix: str = "admin_bot",
+                         database_url: str = "", flush_interval: float = 2.0):
+    """Build the state backend selected by STATE_BACKEND"""
+    if kind == "redis":
+        # Redis persists on its own (appendonly), so SQLite isn't used here
+        return RedisStateBackend.from_url(spam_detector, redis_url, prefix)
+    if kind != "memory":
+        raise ValueError(f"Unknown state backend: {kind!r}")
+    path = sqlite_path(database_url)
+    return MemoryStateBackend(spam_detector, SQLiteStore(path, flush_interval) if path else None)
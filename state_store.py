@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Cache holding at most `maxsize` entries.
+
+    The least recently used entry is evicted when the cache is full. With a
+    `ttl`, entries also expire `ttl` seconds after they were written; expired
+    entries are dropped on access or by `expire()`.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, written_at)
+
+    def _is_expired(self, written_at: float, now: float) -> bool:
+        return self.ttl is not None and now - written_at >= self.ttl
+
+    def __getitem__(self, key):
+        value, written_at = self._data[key]
+        if self._is_expired(written_at, time.monotonic()):
+            del self._data[key]
+            raise KeyError(key)
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def expire(self) -> int:
+        """Drop entries whose TTL has passed and return how many were dropped"""
+        if self.ttl is None:
+            return 0
+        now = time.monotonic()
+        expired = [key for key, (_, written_at) in self._data.items() if self._is_expired(written_at, now)]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
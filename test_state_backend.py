@@ -0,0 +1,248 @@
+"""Tests for RedisStateBackend against an in-process fake Redis (pip install -r requirements-dev.txt)"""
+
+import asyncio
+import time
+
+import fakeredis
+import fakeredis.aioredis
+
+from chat_state import ChatState
+from content_filter import LINKS_INVITES
+from spam_detector import SpamDetector
+from state_backend import RedisStateBackend
+
+CHAT_ID = -1001
+USER_ID = 42
+
+
+def make_backend(server=None, threshold: int = 3, window_seconds: float = 10):
+    client = fakeredis.aioredis.FakeRedis(server=server or fakeredis.FakeServer(), decode_responses=True)
+    return RedisStateBackend(SpamDetector(threshold, window_seconds), client, prefix="test")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_record_message_flags_more_than_threshold_messages_in_window():
+    async def scenario():
+        backend = make_backend(threshold=3, window_seconds=10)
+        state = ChatState(CHAT_ID)
+        results = [await backend.record_message(state, USER_ID, 100.0 + i) for i in range(4)]
+        await backend.close()
+        return results
+
+    assert run(scenario()) == [(False, False)] * 3 + [(False, True)]
+
+
+def test_record_message_ignores_messages_outside_window():
+    async def scenario():
+        backend = make_backend(threshold=3, window_seconds=10)
+        state = ChatState(CHAT_ID)
+        results = [await backend.record_message(state, USER_ID, 100.0 + 5 * i) for i in range(4)]
+        await backend.close()
+        return results
+
+    assert run(scenario())[-1] == (False, False)
+
+
+def test_record_message_uses_chat_spam_limits():
+    async def scenario():
+        backend = make_backend(threshold=10, window_seconds=10)
+        state = ChatState(CHAT_ID)
+        state.spam_limits = (1, 10)
+        results = [await backend.record_message(state, USER_ID, 100.0 + i) for i in range(2)]
+        await backend.close()
+        return results
+
+    assert run(scenario()) == [(False, False), (False, True)]
+
+
+def test_spam_window_is_shared_between_replicas():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        first, second = make_backend(server, threshold=1), make_backend(server, threshold=1)
+        await first.record_message(ChatState(CHAT_ID), USER_ID, 100.0)
+        result = await second.record_message(ChatState(CHAT_ID), USER_ID, 101.0)
+        await first.close()
+        await second.close()
+        return result
+
+    assert run(scenario()) == (False, True)
+
+
+def test_muted_user_is_reported_and_not_counted():
+    async def scenario():
+        backend = make_backend()
+        state = ChatState(CHAT_ID)
+        await backend.mute(state, USER_ID, time.time() + 60, max_mutes=10)
+        result = await backend.record_message(state, USER_ID, time.time())
+        counted = await backend.redis.exists(backend._key(CHAT_ID, "spam", USER_ID))
+        other = await backend.record_message(state, USER_ID + 1, time.time())
+        await backend.close()
+        return result, counted, other
+
+    assert run(scenario()) == ((True, False), 0, (False, False))
+
+
+def test_messages_while_muted_do_not_count_after_mute_ends():
+    async def scenario():
+        backend = make_backend(threshold=3)
+        state = ChatState(CHAT_ID)
+        await backend.mute(state, USER_ID, time.time() + 60, max_mutes=10)
+        for i in range(5):
+            await backend.record_message(state, USER_ID, 100.0 + i)
+        # The mute key expiring on its own
+        await backend.redis.delete(backend._key(CHAT_ID, "mute", USER_ID))
+        result = await backend.record_message(state, USER_ID, 106.0)
+        await backend.close()
+        return result
+
+    assert run(scenario()) == (False, False)
+
+
+def test_mute_clears_spam_window():
+    async def scenario():
+        backend = make_backend(threshold=1)
+        state = ChatState(CHAT_ID)
+        await backend.record_message(state, USER_ID, 100.0)
+        await backend.mute(state, USER_ID, time.time() + 60, max_mutes=10)
+        exists = await backend.redis.exists(backend._key(CHAT_ID, "spam", USER_ID))
+        await backend.close()
+        return exists
+
+    assert run(scenario()) == 0
+
+
+def test_mute_expires_with_its_end_time():
+    async def scenario():
+        backend = make_backend()
+        state = ChatState(CHAT_ID)
+        await backend.mute(state, USER_ID, time.time() + 60, max_mutes=10)
+        ttl = await backend.redis.ttl(backend._key(CHAT_ID, "mute", USER_ID))
+        await backend.close()
+        return ttl
+
+    assert 59 <= run(scenario()) <= 62
+
+
+def test_expired_mute_no_longer_applies():
+    async def scenario():
+        backend = make_backend()
+        state = ChatState(CHAT_ID)
+        await backend.mute(state, USER_ID, time.time() - 5, max_mutes=10)
+        result = await backend.record_message(state, USER_ID, time.time())
+        await backend.close()
+        return result
+
+    assert run(scenario()) == (False, False)
+
+
+def test_unmute_lifts_mute_and_clears_history():
+    async def scenario():
+        backend = make_backend(threshold=1)
+        state = ChatState(CHAT_ID)
+        await backend.record_message(state, USER_ID, 100.0)
+        await backend.mute(state, USER_ID, time.time() + 60, max_mutes=10)
+        await backend.record_message(state, USER_ID, 101.0)
+        removed = await backend.unmute(state, USER_ID)
+        removed_again = await backend.unmute(state, USER_ID)
+        after = await backend.record_message(state, USER_ID, 102.0)
+        await backend.close()
+        return removed, removed_again, after
+
+    assert run(scenario()) == (True, False, (False, False))
+
+
+def test_settings_round_trip():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        writer, reader = make_backend(server), make_backend(server)
+        state = ChatState(CHAT_ID)
+        state.spam_mode = True
+        state.spam_limits = (7, 30)
+        state.merge_window = 15
+        await writer.save_settings(state)
+        loaded = ChatState(CHAT_ID)
+        await reader.load_chat(loaded)
+        saved = (loaded.spam_mode, loaded.spam_limits, loaded.merge_window)
+
+        state.spam_mode = False
+        state.spam_limits = None
+        await writer.save_settings(state)
+        await reader.load_chat(loaded)
+        reset = (loaded.spam_mode, loaded.spam_limits, loaded.merge_window)
+        await writer.close()
+        await reader.close()
+        return saved, reset
+
+    assert run(scenario()) == ((True, (7, 30), 15), (False, None, 15))
+
+
+def test_admins_round_trip():
+    async def scenario():
+        backend = make_backend()
+        state = ChatState(CHAT_ID)
+        state.admins = frozenset({1, 2, 3})
+        await backend.save_admins(state)
+        loaded = ChatState(CHAT_ID)
+        await backend.load_chat(loaded)
+        first = loaded.admins
+
+        state.admins = frozenset()
+        await backend.save_admins(state)
+        await backend.load_chat(loaded)
+        await backend.close()
+        return first, loaded.admins
+
+    assert run(scenario()) == (frozenset({1, 2, 3}), frozenset())
+
+
+def test_filter_round_trip():
+    async def scenario():
+        backend = make_backend()
+        state = ChatState(CHAT_ID)
+        state.content_filter.set_patterns(["casino", "free money"])
+        state.content_filter.link_mode = LINKS_INVITES
+        await backend.save_filter(state)
+        loaded = ChatState(CHAT_ID)
+        await backend.load_chat(loaded)
+        await backend.close()
+        return sorted(loaded.content_filter.patterns), loaded.content_filter.link_mode
+
+    assert run(scenario()) == (["casino", "free money"], LINKS_INVITES)
+
+
+def test_forget_chat_drops_admins_and_settings():
+    async def scenario():
+        backend = make_backend()
+        state = ChatState(CHAT_ID)
+        state.admins = frozenset({1})
+        state.spam_mode = True
+        await backend.save_admins(state)
+        await backend.save_settings(state)
+        await backend.forget_chat(CHAT_ID)
+        loaded = ChatState(CHAT_ID)
+        await backend.load_chat(loaded)
+        await backend.close()
+        return loaded.admins, loaded.spam_mode
+
+    assert run(scenario()) == (frozenset(), False)
+
+
+def test_fails_open_when_redis_is_unavailable():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        backend = make_backend(server, threshold=1)
+        state = ChatState(CHAT_ID)
+        state.admins = frozenset({1})
+        server.connected = False
+        results = [await backend.record_message(state, USER_ID, 100.0 + i) for i in range(3)]
+        await backend.mute(state, USER_ID, time.time() + 60, max_mutes=10)
+        unmuted = await backend.unmute(state, USER_ID)
+        await backend.save_admins(state)
+        await backend.load_chat(state)
+        await backend.close()
+        return results, unmuted, state.admins
+
+    assert run(scenario()) == ([(False, False)] * 3, False, frozenset({1}))
@@ -0,0 +1,114 @@
+"""Tests for ShardedWorkerPool continuations together with the OutboundScheduler's rate limits"""
+
+import asyncio
+import time
+
+from outbound_scheduler import LANE_REPOST, OutboundScheduler
+from worker_pool import ShardedWorkerPool
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_scheduler(chat_rate: float = 0.5, chat_burst: float = 1):
+    return OutboundScheduler(global_rate=1000, global_burst=1000, chat_rate=chat_rate, chat_burst=chat_burst)
+
+
+def reposting_pool(scheduler: OutboundScheduler, sent: list, workers: int = 16):
+    """Pool whose handler reposts every (chat_id, message_id) item through the scheduler"""
+
+    async def send(chat_id: int, message_id: int):
+        sent.append((chat_id, message_id, time.monotonic()))
+
+    async def handler(item):
+        chat_id, message_id = item
+        return lambda: scheduler.submit(chat_id, LANE_REPOST, send, chat_id, message_id)
+
+    return ShardedWorkerPool(handler, workers=workers)
+
+
+def test_rate_limited_chat_does_not_stall_its_shard():
+    async def scenario():
+        scheduler = make_scheduler(chat_rate=0.5, chat_burst=1)
+        sent = []
+        pool = reposting_pool(scheduler, sent, workers=16)
+        pool.start()
+        started = time.monotonic()
+        # Chats 0 and 16 share a worker; chat 0 has one token and refills every 2 s
+        for message_id in range(3):
+            await pool.submit(0, (0, message_id))
+        await pool.submit(16, (16, 0))
+        while not any(chat_id == 16 for chat_id, _, _ in sent):
+            await asyncio.sleep(0.01)
+        quiet_chat_done = time.monotonic() - started
+        busy_chat_sent = sum(1 for chat_id, _, _ in sent if chat_id == 0)
+        await pool.stop(timeout=0)
+        await scheduler.stop()
+        return quiet_chat_done, busy_chat_sent
+
+    quiet_chat_done, busy_chat_sent = run(scenario())
+    assert quiet_chat_done < 0.5
+    assert busy_chat_sent == 1
+
+
+def test_continuations_keep_chat_order():
+    async def scenario():
+        order = []
+
+        async def handler(item):
+            chat_id, message_id, delay = item
+
+            async def continuation():
+                await asyncio.sleep(delay)
+                order.append((chat_id, message_id))
+
+            return continuation
+
+        pool = ShardedWorkerPool(handler, workers=2)
+        pool.start()
+        for message_id, delay in enumerate((0.05, 0.0, 0.02, 0.0)):
+            await pool.submit(1, (1, message_id, delay))
+            await pool.submit(3, (3, message_id, 0.0))
+        await pool.stop()
+        return order
+
+    order = run(scenario())
+    assert [message_id for chat_id, message_id in order if chat_id == 1] == [0, 1, 2, 3]
+    assert [message_id for chat_id, message_id in order if chat_id == 3] == [0, 1, 2, 3]
+    # Chats 1 and 3 share a worker, yet chat 3 never waits for chat 1's slow continuations
+    assert order.index((3, 3)) < order.index((1, 0))
+
+
+def test_stop_waits_for_continuations():
+    async def scenario():
+        scheduler = make_scheduler(chat_rate=20, chat_burst=1)
+        sent = []
+        pool = reposting_pool(scheduler, sent, workers=4)
+        pool.start()
+        for message_id in range(3):
+            await pool.submit(0, (0, message_id))
+        await pool.stop(timeout=5)
+        depths = dict(pool.depths)
+        await scheduler.stop()
+        return [message_id for _, message_id, _ in sent], depths
+
+    assert run(scenario()) == ([0, 1, 2], {})
+
+
+def test_items_without_continuation_are_done_on_the_worker():
+    async def scenario():
+        handled = []
+
+        async def handler(item):
+            handled.append(item)
+            return None
+
+        pool = ShardedWorkerPool(handler, workers=2)
+        pool.start()
+        for item in range(5):
+            await pool.submit(7, item)
+        await pool.stop()
+        return handled, dict(pool.depths)
+
+    assert run(scenario()) == ([0, 1, 2, 3, 4], {})
@@ -0,0 +1,67 @@
+import asyncio
+import sys
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class _ChatLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0  # updates holding or waiting for the lock
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently, and those of one chat in order.
+
+    At most `max_concurrent_updates` updates run at once. The limit is
+    applied only after an update holds its chat's lock: the base class
+    semaphore would be taken first, so a busy chat's queued updates could
+    occupy every slot while waiting on each other and stall all other chats.
+    """
+
+    __slots__ = ("_slots", "_chat_locks")
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(sys.maxsize)
+        self._max_concurrent_updates = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks = {}  # chat_id -> _ChatLock, present only while in use
+
+    @staticmethod
+    def _chat_key(update: object):
+        if isinstance(update, Update) and update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine):
+        chat_id = self._chat_key(update)
+        if chat_id is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        chat_lock = self._chat_locks.get(chat_id)
+        if chat_lock is None:
+            chat_lock = self._chat_locks[chat_id] = _ChatLock()
+        chat_lock.users += 1
+        try:
+            async with chat_lock.lock:
+                async with self._slots:
+                    await coroutine
+        finally:
+            chat_lock.users -= 1
+            if not chat_lock.users:
+                del self._chat_locks[chat_id]
+
+    def busy_chats(self) -> int:
+        """Chats with an update running or waiting"""
+        return len(self._chat_locks)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
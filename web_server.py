@@ -0,0 +1,74 @@
+import hashlib
+import hmac
+import logging
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def derive_secret_token(bot_token: str) -> str:
+    """Webhook secret derived from the bot token, so every replica registers the same one"""
+    return hmac.new(bot_token.encode(), b"webhook-secret-token", hashlib.sha256).hexdigest()
+
+
+class WebServer:
+    """Async HTTP server on the bot port (webhook ingestion, metrics)"""
+
+    def __init__(self, application: Application, host: str, port: int,
+                 webhook_path: str = "/webhook", secret_token: str = ""):
+        # webhook_path=None serves only the extra routes (polling mode)
+        self.application = application
+        self.host = host
+        self.port = port
+        self.webhook_path = webhook_path
+        # Telegram echoes this token in every webhook request; without one
+        # anybody who finds the URL could inject updates, so derive it
+        self.secret_token = secret_token or derive_secret_token(application.bot.token)
+
+        self.app = web.Application()
+        if self.webhook_path is not None:
+            self.app.router.add_post(self.webhook_path, self._handle_webhook)
+        self._runner = None
+
+    def add_route(self, method: str, path: str, handler):
+        """Register an extra route (must be called before start)"""
+        self.app.router.add_route(method, path, handler)
+
+    async def _handle_webhook(self, request: web.Request) -> web.Response:
+        """Validate and enqueue an update, acknowledging before any handler runs"""
+        received_token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(received_token, self.secret_token):
+            logger.warning(f"Rejected webhook request with invalid secret token from {request.remote}")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.error(f"Malformed webhook payload: {e}")
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+
+        # update_queue is unbounded, so this never blocks the response
+        self.application.update_queue.put_nowait(update)
+        return web.Response()
+
+    async def start(self):
+        """Start listening"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Web server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop listening and close open connections"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+
+from metrics import QUEUE_WAIT, WORKER_ITEMS
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedWorkerPool:
+    """Fixed set of worker tasks processing items in per-chat order.
+
+    Each chat is owned by one worker (chat id modulo the worker count), so a
+    chat's items are handled one at a time in arrival order while different
+    chats proceed on the other workers. Every worker has a bounded queue:
+    when it is full, `submit` waits, which pushes back on update intake
+    instead of growing memory without limit.
+
+    The handler may return a continuation (an async callable without
+    arguments) for the part of an item that waits on Telegram, such as a
+    rate-limited repost. Continuations run in a per-chat chain, each after the
+    chat's previous one, so the worker moves on to other chats' items
+    meanwhile. A chat with more than `max_chat_backlog` items pending holds its
+    worker until its chain catches up.
+    """
+
+    def __init__(self, handler, workers: int = 16, queue_size: int = 1000, max_chat_backlog: int = None):
+        self.handler = handler  # async callable(item) -> continuation or None
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.max_chat_backlog = max_chat_backlog or queue_size
+        self.depths = {}  # chat_id -> items queued, being handled or continuing; absent when 0
+        self._workers = []
+        self._chains = {}  # chat_id -> task running the chat's last continuation
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work(queue)) for queue in self.queues]
+
+    async def stop(self, timeout: float = 5.0):
+        """Give queued items and their continuations up to `timeout` seconds to finish, then cancel them"""
+        if not self._workers:
+            return
+
+        async def drain():
+            await asyncio.gather(*(queue.join() for queue in self.queues))
+            while self._chains:
+                await asyncio.gather(*self._chains.values(), return_exceptions=True)
+
+        try:
+            await asyncio.wait_for(drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping workers with {sum(self.depths.values())} messages still queued")
+        tasks = [*self._workers, *self._chains.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._chains.clear()
+
+    def _queue_for(self, chat_id: int) -> asyncio.Queue:
+        return self.queues[chat_id % len(self.queues)]
+
+    async def submit(self, chat_id: int, item):
+        """Queue an item for its chat's worker, waiting while that worker's queue is full"""
+        self.depths[chat_id] = self.depths.get(chat_id, 0) + 1
+        try:
+            await self._queue_for(chat_id).put((chat_id, item, time.monotonic()))
+        except BaseException:
+            self._done(chat_id)
+            raise
+
+    def depth(self, chat_id: int) -> int:
+        """Items of a chat that are queued, being handled or continuing"""
+        return self.depths.get(chat_id, 0)
+
+    def _done(self, chat_id: int):
+        remaining = self.depths[chat_id] - 1
+        if remaining:
+            self.depths[chat_id] = remaining
+        else:
+            del self.depths[chat_id]
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            chat_id, item, queued_at = await queue.get()
+            QUEUE_WAIT.observe(time.monotonic() - queued_at)
+            continuation = None
+            try:
+                continuation = await self.handler(item)
+                if continuation is None:
+                    WORKER_ITEMS.labels("ok").inc()
+            except Exception as e:
+                WORKER_ITEMS.labels("error").inc()
+                logger.error(f"Error processing message in queue for chat {chat_id}: {e}")
+            finally:
+                if continuation is None:
+                    self._done(chat_id)
+                queue.task_done()
+            if continuation is not None:
+                await self._chain(chat_id, continuation)
+
+    async def _chain(self, chat_id: int, continuation):
+        previous = self._chains.get(chat_id)
+        task = self._chains[chat_id] = asyncio.create_task(self._continue(chat_id, previous, continuation))
+        task.add_done_callback(lambda done: self._chain_done(chat_id, done))
+        if self.depths[chat_id] > self.max_chat_backlog:
+            # Runaway chat: stop taking its shard's items until its chain catches up
+            await asyncio.wait([task])
+
+    async def _continue(self, chat_id: int, previous, continuation):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await continuation()
+            WORKER_ITEMS.labels("ok").inc()
+        except Exception as e:
+            WORKER_ITEMS.labels("error").inc()
+            logger.error(f"Error processing message in queue for chat {chat_id}: {e}")
+        finally:
+            self._done(chat_id)
+
+    def _chain_done(self, chat_id: int, task: asyncio.Task):
+        if self._chains.get(chat_id) is task:
+            del self._chains[chat_id]